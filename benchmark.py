@@ -0,0 +1,599 @@
+#!/usr/bin/env python3
+"""
+Offline benchmarks for chartbutler.
+
+Starts a local stand-in for The Chart Locker, Sailing Grace and MediaFire,
+times the scraping, resolution and download paths against it, and compares
+the results with a saved JSON baseline.
+
+    python benchmark.py --out bench.json               # record a baseline
+    python benchmark.py --baseline bench.json          # flag regressions
+    python benchmark.py --latency 50 --bandwidth 20M --drops 2
+"""
+import argparse, os, platform, random, re, socket, sqlite3, statistics, subprocess
+import sys, tempfile, threading, time, zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# progress bars would drown the report (tqdm reads this at import)
+os.environ.setdefault("TQDM_DISABLE", "1")
+import chartbutler as cb
+
+# ───── fixtures ─────
+def chartlocker_html(root, regions, rows, seed=1):
+    """
+    Synthetic Chart Locker page: an <h2> per region followed by tables of
+    area rows whose links point at the stand-in MediaFire pages (tagged
+    with a mediafire.com query, as the scraper only keeps those links).
+    """
+    R = random.Random(seed)
+    out = ['<html><body><h2>The Chart Locker</h2><table><tr><td>intro</td></tr></table>']
+    for r in range(regions):
+        out.append(f'<h2>Region {r}</h2>')
+        out.append('<table><thead><tr><th>Area</th><th>Files</th><th>Notes</th></tr></thead><tbody>')
+        for i in range(rows):
+            links = ''.join(
+                f'<a href="{root}file/k{r}x{i}x{j}/chart_{r}_{i}_{j}.zip/file?host=www.mediafire.com">'
+                f'Part {j}</a>'
+                f' {R.randint(5, 900)} MB<br>' for j in range(R.randint(1, 3)))
+            note = R.choice(['', 'Updated 2024', 'zoom 10-16 <b>new</b>'])
+            out.append(f'<tr><td>Island {i} <i>group</i></td><td>{links}</td><td>{note}</td></tr>')
+        out.append('</tbody></table>')
+    out.append('<h2>Other Resources</h2><table><tr><td>-</td></tr></table></body></html>')
+    return '\n'.join(out)
+
+def savinggrace_html(root, regions, rows, seed=2):
+    """
+    Synthetic Sailing Grace page: <hr id>-separated regions, <h3> subregions
+    and <li class="row"> areas with direct .mbtiles links.
+    """
+    R = random.Random(seed)
+    out = ['<html><body>']
+    for r in range(regions):
+        out.append(f'<hr id="r{r}"><div><h2>Region {r}</h2></div>')
+        for sub in range(4):
+            out.append(f'<h3>Sub {sub} (Z10-16)</h3><ul>')
+            for i in range(max(1, rows // 4)):
+                maps = ''.join(
+                    f'<div class="map"><a href="{root}dl/r{r}s{sub}i{i}m{j}.mbtiles">'
+                    f'{R.randint(1, 999)} MB</a></div>' for j in range(R.randint(1, 3)))
+                out.append(f'<li class="row"><div class="area">Area {i}</div>'
+                           f'<div class="created">2024-05-1{R.randint(0, 9)}</div>{maps}</li>')
+            out.append('</ul>')
+    out.append('</body></html>')
+    return '\n'.join(out)
+
+def mediafire_html(href):
+    """
+    MediaFire-like landing page with a download button.
+    """
+    return (f'<html><head><script>var x=1;</script></head><body><div class="dl-info">'
+            f'<a class="input popsok" aria-label="Download file" id="downloadButton" '
+            f'href="{href}">Download</a></div></body></html>')
+
+def make_mbtiles(path, size):
+    """
+    A valid MBTiles database of about size bytes of incompressible tiles.
+    """
+    db = sqlite3.connect(path)
+    db.execute("CREATE TABLE metadata (name TEXT, value TEXT)")
+    db.execute("CREATE TABLE tiles (zoom_level INTEGER, tile_column INTEGER,"
+               " tile_row INTEGER, tile_data BLOB)")
+    db.executemany("INSERT INTO metadata VALUES (?, ?)",
+                   [("name", "bench"), ("format", "png"), ("minzoom", "0"), ("maxzoom", "16")])
+    tile = 32 << 10
+    db.executemany("INSERT INTO tiles VALUES (16, ?, ?, ?)",
+                   ((n, n, os.urandom(tile)) for n in range(max(1, size // tile))))
+    db.commit()
+    db.close()
+
+def make_fixtures(folder, payload):
+    """
+    Build the download payloads in folder: chart.mbtiles and chart.zip
+    (the same chart, deflated). Reused when already there at that size.
+    """
+    mb = os.path.join(folder, "chart.mbtiles")
+    zp = os.path.join(folder, "chart.zip")
+    stamp = os.path.join(folder, "payload")
+    if cb.read_json(stamp, None) != payload:
+        for f in (mb, zp):
+            if os.path.exists(f):
+                os.remove(f)
+        make_mbtiles(mb, payload)
+        with zipfile.ZipFile(zp, "w", zipfile.ZIP_DEFLATED) as z:
+            z.write(mb, "charts/chart.mbtiles")
+        cb.write_json(stamp, payload)
+    return {"chart.mbtiles": mb, "chart.zip": zp}
+
+# ───── stand-in server ─────
+class Handler(BaseHTTPRequestHandler):
+    """
+    Routes:
+      /chartlocker/        synthetic or saved Chart Locker page
+      /charts              synthetic or saved Sailing Grace page
+      /file/<key>/<name>/file          MediaFire landing page
+                                        (?anchor=relative: protocol-relative href)
+      /file_premium/<key>/<name>/file  302 to /dl/<name>
+      /dl/<name>           payload; any *.mbtiles name serves chart.mbtiles
+    Every response waits cfg["latency"] seconds first; payloads honour
+    Range/If-Range, are paced to cfg["bandwidth"] bytes/s and the first
+    cfg["drops"] of them are cut off after cfg["drop_after"] bytes.
+    """
+    protocol_version = "HTTP/1.1"
+    # headers and small bodies go out as separate writes; don't let Nagle
+    # and delayed ACKs add 40 ms to every page
+    disable_nagle_algorithm = True
+
+    def log_message(self, *a):
+        pass
+
+    def do_HEAD(self):
+        self.route(head=True)
+
+    def do_GET(self):
+        self.route()
+
+    def route(self, head=False):
+        cfg = self.server.cfg
+        with self.server.lock:
+            self.server.hits += 1
+        if cfg["latency"]:
+            time.sleep(cfg["latency"])
+        url = urlparse(self.path)
+        parts = url.path.strip("/").split("/")
+        if url.path in self.server.pages:
+            return self.send_body(self.server.pages[url.path], "text/html", head)
+        if parts[0] == "file_premium" and len(parts) >= 3:
+            return self.send_empty(302, Location=f"/dl/{parts[2]}")
+        if parts[0] == "file" and len(parts) >= 3:
+            if head:
+                return self.send_empty(200)
+            name = parts[2]
+            if parse_qs(url.query).get("anchor") == ["relative"]:
+                href = f"//download1.mediafire.com/bench/{parts[1]}/{name}"
+            else:
+                href = f"https://download1.mediafire.com/bench/{parts[1]}/{name}"
+            return self.send_body(mediafire_html(href).encode(), "text/html", head)
+        if parts[0] == "dl" and len(parts) == 2:
+            name = "chart.mbtiles" if parts[1].endswith(".mbtiles") else parts[1]
+            if name in self.server.files:
+                return self.send_file(self.server.files[name], head)
+        self.send_empty(404)
+
+    def send_empty(self, code, **headers):
+        self.send_response(code)
+        for k, v in headers.items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def send_body(self, body, ctype, head):
+        self.send_response(200)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if not head:
+            self.wfile.write(body)
+
+    def send_file(self, path, head):
+        cfg = self.server.cfg
+        st = os.stat(path)
+        n = st.st_size
+        etag = '"%x-%x"' % (st.st_mtime_ns, n)
+        start, end, code = 0, n - 1, 200
+        rng, if_range = self.headers.get("Range"), self.headers.get("If-Range")
+        m = re.match(r"bytes=(\d+)-(\d*)$", rng or "")
+        if m and (not if_range or if_range == etag):
+            start = int(m.group(1))
+            end = min(int(m.group(2)), n - 1) if m.group(2) else n - 1
+            if start >= n:
+                return self.send_empty(416, **{"Content-Range": f"bytes */{n}"})
+            code = 206
+        self.send_response(code)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", etag)
+        if code == 206:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{n}")
+        self.end_headers()
+        if head:
+            return
+        cut = None
+        with self.server.lock:
+            if cfg["drops"] > 0 and end - start + 1 > cfg["drop_after"]:
+                cfg["drops"] -= 1
+                cut = start + cfg["drop_after"]
+        rate, sent, t0 = cfg["bandwidth"], 0, time.monotonic()
+        with open(path, "rb") as fp:
+            fp.seek(start)
+            pos = start
+            while pos <= end:
+                chunk = fp.read(min(256 << 10, end + 1 - pos, (cut - pos) if cut else 1 << 62))
+                if not chunk:
+                    break
+                try:
+                    self.wfile.write(chunk)
+                except OSError:
+                    return
+                pos += len(chunk)
+                sent += len(chunk)
+                if rate:
+                    ahead = sent / rate - (time.monotonic() - t0)
+                    if ahead > 0:
+                        time.sleep(ahead)
+                if cut and pos >= cut:
+                    # mid-stream disconnect: the client sees a short body
+                    self.close_connection = True
+                    self.wfile.flush()
+                    self.connection.shutdown(socket.SHUT_RDWR)
+                    return
+
+class StandIn(ThreadingHTTPServer):
+    """
+    The local HTTP server, run on a daemon thread.
+    """
+    daemon_threads = True
+
+    def __init__(self, files, latency=0.0, bandwidth=None, drop_after=None, drops=0):
+        super().__init__(("127.0.0.1", 0), Handler)
+        self.root = f"http://127.0.0.1:{self.server_port}/"
+        self.files, self.pages = files, {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.cfg = {"latency": latency, "bandwidth": bandwidth,
+                    "drop_after": drop_after or 0, "drops": 0}
+        self.drops = drops
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    def arm_drops(self):
+        """
+        Re-arm the mid-stream disconnects for the next download.
+        """
+        self.cfg["drops"] = self.drops if self.cfg["drop_after"] else 0
+
+# ───── startup ─────
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# loaded on first use, never by `import chartbutler` (nor by `list`, for the HTTP/HTML stack)
+HEAVY = ("requests", "bs4", "lxml", "tqdm", "tabulate", "fuzzywuzzy", "rich", "multiprocessing")
+HTML_STACK = ("requests", "bs4", "lxml")
+
+# prints the import time, then which of the modules named in argv got loaded
+IMPORT = ("import sys, time; t = time.perf_counter(); import chartbutler; "
+          "print(time.perf_counter() - t); "
+          "print(' '.join(sorted({m.split('.')[0] for m in sys.modules} & set(sys.argv[1:]))))")
+LIST = ("import sys, chartbutler; chartbutler.sys.argv = ['chartbutler', 'list'] + sys.argv[1:]; "
+        "chartbutler.main(); print(' '.join(sorted({m.split('.')[0] for m in sys.modules} & "
+        f"{set(HTML_STACK)!r})), file=sys.stderr)")
+
+def interpreter(code, *args):
+    """
+    Run code in a fresh interpreter beside chartbutler.py, with bytecode
+    caching on as for an installed copy; return (seconds, stdout, stderr).
+    """
+    env = dict(os.environ)
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    t0 = time.perf_counter()
+    p = subprocess.run([sys.executable, "-c", code, *args], cwd=HERE, env=env,
+                       capture_output=True, text=True, check=True)
+    return time.perf_counter() - t0, p.stdout, p.stderr
+
+def import_runs(repeat):
+    """
+    Time `import chartbutler` in fresh interpreters; return (runs, heavy
+    modules it loaded).
+    """
+    interpreter(IMPORT)   # warm the bytecode cache
+    runs, loaded = [], set()
+    for _ in range(repeat):
+        out = interpreter(IMPORT, *HEAVY)[1].split("\n")
+        runs.append(float(out[0]))
+        loaded.update(out[1].split())
+    return runs, sorted(loaded)
+
+def list_runs(repeat, cache_dir):
+    """
+    Time `chartbutler.py list` from a warm catalog cache, interpreter
+    start-up included; return (runs, HTML-stack modules it loaded).
+    """
+    runs, loaded = [], set()
+    for _ in range(repeat):
+        secs, _, err = interpreter(LIST, "--cache-dir", cache_dir)
+        runs.append(secs)
+        loaded.update(err.strip().split("\n")[-1].split())
+    return runs, sorted(loaded)
+
+# ───── benchmarks ─────
+def region_tables(doc):
+    """
+    The per-region table groups scrape() hands to parse_region().
+    """
+    groups, region = [], None
+    for tag in doc.find_all(["h2", "table"]):
+        if tag.name == "h2" and tag.get_text(strip=True):
+            region = []
+            groups.append(region)
+        elif tag.name == "table" and region is not None:
+            region.append(tag)
+    return [g for g in groups if g]
+
+def timed(fn, repeat, setup=None):
+    """
+    Run fn() repeat times (after setup(), untimed); return the wall times.
+    """
+    runs = []
+    for _ in range(repeat):
+        arg = setup() if setup else None
+        t0 = time.perf_counter()
+        fn(arg) if setup else fn()
+        runs.append(time.perf_counter() - t0)
+    return runs
+
+def run_benchmarks(a, srv, sess, work):
+    """
+    Time each entry point against the stand-in; return {name: result}.
+    """
+    results = {}
+
+    def record(name, runs, nbytes=None, **extra):
+        med = statistics.median(runs)
+        results[name] = {"median": med, "min": min(runs), "runs": runs, **extra}
+        if nbytes:
+            results[name]["mb_per_s"] = nbytes / med / 1e6
+        print(f"  {name:<28} {med * 1000:10.1f} ms" +
+              (f"  {nbytes / med / 1e6:8.1f} MB/s" if nbytes else ""))
+
+    runs, loaded = import_runs(a.repeat * 3)
+    record("import", runs, loaded=loaded)
+    # an empty tree would time nothing but the page fetch
+    for name, scraper in (("Chart Locker", cb.scrape), ("Sailing Grace", cb.scrape_savinggrace)):
+        if not scraper(sess):
+            sys.exit(f"the {name} page served by the stand-in yields no charts")
+    record("scrape", timed(lambda: cb.scrape(sess), a.repeat))
+    record("scrape_savinggrace", timed(lambda: cb.scrape_savinggrace(sess), a.repeat))
+    # every catalog from cold: fetched on threads, parsed in worker processes
+    opts = cb.cli(["--refresh", "--parser", a.parser, "--cache-dir", os.path.join(work, "catalogs")])
+    record("catalogs[all]", timed(lambda: cb.load_catalogs(cb.SOURCES, sess, opts), a.repeat))
+    # `list` reads what a previous run left in the catalog cache
+    cache = os.path.join(work, "cache")
+    entries = []
+    for source, scraper in (("chartlocker", cb.scrape), ("savinggrace", cb.scrape_savinggrace)):
+        tree = scraper(sess)
+        cb.write_json(os.path.join(cache, f"catalog-{source}.json"),
+                      {"url": "", "etag": "", "last_modified": "",
+                       "fetched": time.time(), "tree": tree})
+        entries += [(source, region, row) for region, rows in tree.items() for row in rows]
+    runs, loaded = list_runs(a.repeat, cache)
+    record("list", runs, loaded=loaded)
+    # the search index over both catalogs: built once, saved, then queried
+    record("search_index[build]", timed(lambda: cb.SearchIndex(entries), a.repeat))
+    stamp = {"bench": 1}
+    cb.SearchIndex.cached(entries, stamp, cache)
+    record("search_index[load]", timed(lambda: cb.SearchIndex.cached(entries, stamp, cache), a.repeat))
+    index = cb.SearchIndex(entries)
+    queries = ("island 12", "regoin 3 grup", "area <100MB", "chart_4_1")
+    record("search", timed(lambda: [index.search(q) for q in queries], a.repeat * 10))
+    groups = region_tables(cb.soup(cb.BASE, sess))
+    record("parse_region", timed(lambda: [cb.parse_region(g) for g in groups], a.repeat))
+
+    # MediaFire resolution, one strategy per variant
+    key = f"{srv.root}file/kbench/chart.zip/file"
+    for name, url in (("mediafire_direct[redirect]", key.replace("/file/", "/file_premium/")),
+                      ("mediafire_direct[page]", key),
+                      ("mediafire_direct[scrape]", key + "?anchor=relative")):
+        record(name, timed(lambda: cb.mediafire_direct(url, sess), a.repeat * 10))
+
+    # downloads into a fresh folder each run
+    count = iter(range(1 << 30))
+
+    def fresh():
+        srv.arm_drops()
+        dest = os.path.join(work, f"run{next(count)}")
+        os.makedirs(dest)
+        return dest
+
+    def fetch(url, s):
+        return lambda dest: cb.fetch(url, dest, s, set())
+
+    for fname in ("chart.mbtiles", "chart.zip"):
+        size = os.path.getsize(srv.files[fname])
+        url = f"{srv.root}dl/{fname}"
+        record(f"fetch[{fname}]", timed(fetch(url, sess), a.repeat, fresh), size)
+    url = f"{srv.root}dl/chart.zip"
+    size = os.path.getsize(srv.files["chart.zip"])
+    if a.segments > 1:
+        seg = make_session(a, segments=a.segments)
+        record(f"fetch[segments={a.segments}]", timed(fetch(url, seg), a.repeat, fresh), size)
+    record("fetch[stream-zip]", timed(fetch(url, make_session(a, stream_zip=True)),
+                                      a.repeat, fresh), size)
+    return results
+
+# ───── baseline ─────
+def compare(results, baseline, tolerance):
+    """
+    Print each benchmark against the baseline; return the regressed names.
+    """
+    old = baseline.get("results", {})
+    regressed = []
+    print(f"\n  {'benchmark':<28} {'baseline':>10} {'now':>10} {'change':>8}")
+    for name, res in results.items():
+        if name not in old:
+            print(f"  {name:<28} {'-':>10} {res['median'] * 1000:8.1f}ms {'new':>8}")
+            continue
+        before, now = old[name]["median"], res["median"]
+        change = now / before - 1 if before else 0.0
+        flag = ""
+        if change > tolerance:
+            flag = "  ⚠ REGRESSION"
+            regressed.append(name)
+        print(f"  {name:<28} {before * 1000:8.1f}ms {now * 1000:8.1f}ms {change:+8.0%}{flag}")
+    return regressed
+
+def startup_problems(results, budget_ms):
+    """
+    Start-up checks that fail the run regardless of any baseline.
+    """
+    problems = []
+    took = results["import"]["median"] * 1000
+    if took > budget_ms:
+        problems.append(f"import chartbutler takes {took:.0f} ms (budget {budget_ms:.0f} ms)")
+    if results["import"]["loaded"]:
+        problems.append("import chartbutler loads " + ", ".join(results["import"]["loaded"]))
+    if results["list"]["loaded"]:
+        problems.append("list loads " + ", ".join(results["list"]["loaded"]))
+    return problems
+
+# ───── saved pages ─────
+# catalog pages kept in the repo, each next to the tree the scrapers made of
+# it before their single-pass rewrite (<page>.json; <page>.lxml.json where
+# lxml repairs broken markup differently from html.parser)
+PAGES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pages")
+
+def page_mismatches(folder=PAGES_DIR):
+    """
+    Scrape every saved page with each installed parser and list the pages
+    whose tree differs from the expected one. The page name starts with
+    the source it belongs to.
+    """
+    parsers = ["html.parser"] + (["lxml"] if cb.html_parser() == "lxml" else [])
+    problems = []
+    for name in sorted(os.listdir(folder)):
+        if not name.endswith(".html"):
+            continue
+        stem = os.path.join(folder, name[:-5])
+        with open(stem + ".html", encoding="utf-8") as fp:
+            text = fp.read()
+        scraper = cb.SOURCES[name.split("-")[0].split(".")[0]].scrape
+        for parser in parsers:
+            expected = cb.read_json(f"{stem}.{parser}.json") or cb.read_json(stem + ".json")
+            # JSON has no tuples; compare the rows as lists
+            tree = {r: [list(row) for row in rows]
+                    for r, rows in cb.parse_catalog(scraper, text, parser).items()}
+            if tree != expected:
+                problems.append(f"{name} scrapes differently with {parser}")
+    return problems
+
+# ───── main ─────
+def make_session(a, **overrides):
+    """
+    A chartbutler session built from its own option parser, without the
+    MediaFire link cache so every resolution hits the stand-in.
+    """
+    argv = ["--parser", a.parser, "--segments", str(overrides.get("segments", 1))]
+    if overrides.get("stream_zip"):
+        argv.append("--stream-zip")
+    opts = cb.cli(argv)
+    opts.cache_dir = None
+    return cb.make_session(opts)
+
+def cli(argv=None):
+    p = argparse.ArgumentParser(
+        description="Benchmark chartbutler against a local stand-in server")
+    p.add_argument("--regions", type=int, default=20,
+                   help="Regions on each synthetic catalog page (default: 20)")
+    p.add_argument("--rows", type=int, default=60,
+                   help="Area rows per region (default: 60)")
+    p.add_argument("--chartlocker-html", metavar="FILE",
+                   help="Serve a saved Chart Locker page instead of the synthetic one")
+    p.add_argument("--savinggrace-html", metavar="FILE",
+                   help="Serve a saved Sailing Grace page instead of the synthetic one")
+    p.add_argument("--payload", type=cb.parse_size, default=cb.parse_size("64M"),
+                   help="Size of the download payloads (default: 64M)")
+    p.add_argument("--fixtures", metavar="DIR",
+                   help="Keep the generated payloads here between runs")
+    p.add_argument("--latency", type=float, default=0.0, metavar="MS",
+                   help="Delay every response by MS milliseconds")
+    p.add_argument("--bandwidth", type=cb.parse_size, metavar="RATE",
+                   help="Pace each payload stream to RATE bytes/s, e.g. 20M")
+    p.add_argument("--drops", type=int, default=0,
+                   help="Cut off the first N payload responses of each download")
+    p.add_argument("--drop-after", type=cb.parse_size, metavar="SIZE",
+                   help="Bytes sent before a cut-off (default: a third of the payload)")
+    p.add_argument("--segments", type=int, default=4,
+                   help="Also time a segmented fetch with N connections (default: 4)")
+    p.add_argument("--parser", default="auto", choices=["auto", "lxml", "html.parser"],
+                   help="HTML parser backend (default: auto)")
+    p.add_argument("--repeat", type=int, default=3,
+                   help="Runs per benchmark; the median is reported (default: 3)")
+    p.add_argument("--out", metavar="FILE", help="Write the results as a JSON baseline")
+    p.add_argument("--baseline", metavar="FILE", help="Compare against a saved baseline")
+    p.add_argument("--tolerance", type=float, default=0.2,
+                   help="Slowdown over the baseline that counts as a regression (default: 0.2)")
+    p.add_argument("--import-budget", type=float, default=100, metavar="MS",
+                   help="Fail when `import chartbutler` takes longer (default: 100)")
+    p.add_argument("--check-pages", action="store_true",
+                   help="Only check the saved catalog pages against their expected trees")
+    return p.parse_args(argv)
+
+def main(argv=None):
+    a = cli(argv)
+    # chartbutler's progress and status lines would interleave with the report
+    cb.log = lambda *args: None
+    mismatched = page_mismatches()
+    for problem in mismatched:
+        print(f"⚠ saved pages: {problem}")
+    if a.check_pages:
+        if not mismatched:
+            print(f"Saved pages in {PAGES_DIR} scrape as expected")
+        sys.exit(1 if mismatched else 0)
+    # fail on unusable --out/--baseline files now, not after the benchmarks
+    if a.out:
+        out_dir = os.path.dirname(os.path.abspath(a.out))
+        try:
+            os.makedirs(out_dir, exist_ok=True)
+        except OSError as e:
+            sys.exit(f"cannot write results to {a.out}: {e}")
+        if os.path.isdir(a.out) or not os.access(out_dir, os.W_OK):
+            sys.exit(f"cannot write results to {a.out}")
+    baseline = cb.read_json(a.baseline, None) if a.baseline else None
+    if a.baseline and baseline is None:
+        sys.exit(f"cannot read baseline {a.baseline}")
+    params = {k: getattr(a, k) for k in ("regions", "rows", "chartlocker_html",
+              "savinggrace_html", "payload", "latency", "bandwidth", "drops",
+              "drop_after", "segments", "parser", "repeat", "import_budget")}
+    with tempfile.TemporaryDirectory(prefix="chartbutler-bench-") as tmp:
+        fixtures = a.fixtures or os.path.join(tmp, "fixtures")
+        os.makedirs(fixtures, exist_ok=True)
+        print(f"Building {a.payload / 1e6:.0f} MB payloads in {fixtures} …")
+        files = make_fixtures(fixtures, a.payload)
+        srv = StandIn(files, latency=a.latency / 1000, bandwidth=a.bandwidth,
+                      drop_after=a.drop_after or os.path.getsize(files["chart.zip"]) // 3,
+                      drops=a.drops)
+        for path, saved, synth in (("/chartlocker/", a.chartlocker_html, chartlocker_html),
+                                   ("/charts", a.savinggrace_html, savinggrace_html)):
+            if saved:
+                with open(saved, "rb") as fp:
+                    srv.pages[path] = fp.read()
+            else:
+                srv.pages[path] = synth(srv.root, a.regions, a.rows).encode()
+        # point the catalog scrapers at the stand-in
+        cb.BASE, cb.SAVE_URL = srv.root + "chartlocker/", srv.root + "charts"
+        for name, url in (("chartlocker", cb.BASE), ("savinggrace", cb.SAVE_URL)):
+            cb.SOURCES[name] = cb.SOURCES[name]._replace(url=url)
+        print(f"Stand-in server at {srv.root}\n")
+        try:
+            results = run_benchmarks(a, srv, make_session(a), os.path.join(tmp, "work"))
+        finally:
+            srv.shutdown()
+    report = {"meta": {"python": platform.python_version(), "platform": platform.platform(),
+                       "created": time.strftime("%Y-%m-%dT%H:%M:%S"), "params": params},
+              "results": results}
+    if a.out:
+        cb.write_json(a.out, report)
+        print(f"\nResults written to {a.out}")
+    regressed = []
+    if baseline:
+        if baseline.get("meta", {}).get("params") != params:
+            print("\n⚠ baseline was recorded with different parameters")
+        regressed = compare(results, baseline, a.tolerance)
+        if regressed:
+            print(f"\n{len(regressed)} benchmark(s) regressed more than {a.tolerance:.0%}")
+    over = startup_problems(results, a.import_budget)
+    for problem in over:
+        print(f"⚠ start-up budget: {problem}")
+    if regressed or over or mismatched:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
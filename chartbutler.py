@@ -7,27 +7,125 @@
 #  (opt) pip install python-Levenshtein zipfile-deflate64
 # ----------------------------------------------------------
 
-import argparse, os, re, sys, zipfile, shutil
-try:
-    from zipfile_deflate64 import ZipFile as Deflate64ZipFile
-    zipfile.ZipFile = Deflate64ZipFile
-except ImportError:
-    pass
-from urllib.parse import urlparse
-import requests, bs4, tqdm
-from tabulate import tabulate
-from fuzzywuzzy import process as fuzz
-from rich.console import Console
-from rich.table import Table
+import argparse, bisect, fnmatch, hashlib, http.client, importlib, json, os, re, socket, sqlite3, struct, sys, unicodedata, zipfile, zlib, shutil, threading, time
+from collections import namedtuple
+from contextlib import contextmanager, nullcontext
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from queue import Queue
+from urllib.parse import parse_qs, quote, unquote, urlparse
+
+# ───── lazy imports ─────
+# the HTTP, HTML and terminal-UI stack costs about a second on a Raspberry
+# Pi; `--help`, `list` and `verify` never touch most of it
+class LazyModule:
+    """
+    Placeholder for a heavy module: imported on first attribute access,
+    after which the global it is bound to points at the real module.
+    """
+    def __init__(self, name, alias):
+        self._name, self._alias = name, alias
+
+    def __getattr__(self, attr):
+        module = importlib.import_module(self._name)
+        globals()[self._alias] = module
+        return getattr(module, attr)
+
+requests = LazyModule("requests", "requests")
+bs4 = LazyModule("bs4", "bs4")
+tqdm = LazyModule("tqdm", "tqdm")
+fuzz = LazyModule("fuzzywuzzy.process", "fuzz")
+
+def tabulate(*args, **kwargs):
+    from tabulate import tabulate
+    return tabulate(*args, **kwargs)
+
+def open_zip(path):
+    """
+    Open a ZIP for extraction. zipfile-deflate64, when installed, patches
+    zipfile on import to read Deflate64 members; only extraction pays for it.
+    """
+    try:
+        import zipfile_deflate64  # noqa: F401
+    except ImportError:
+        pass
+    return zipfile.ZipFile(path)
 
 BASE = "https://chartlocker.brucebalan.com/"
+SAVE_URL = "https://sailingamazinggrace.com/charts"
 UA   = "ChartButler/0.9.1 (+https://github.com/wrxco/chartbutler)"
 
+BROWSER_UA = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+    "AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/115.0.0.0 Safari/537.36"
+)
+
+# parsed catalogs and link caches live here between runs
+CACHE_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "chartbutler"
+)
+
+# how often a broken transfer is resumed before giving up on the file
+RESUME_ATTEMPTS = 5
+
+# files at least this large are split into byte ranges when --segments > 1
+SEGMENT_MIN_SIZE = 32 << 20
+
+# single-stream downloads: read buffers in flight to the write-behind thread,
+# and the read size range, adapted so each read takes about CHUNK_TARGET s
+WRITE_RING = 4
+CHUNK_MIN, CHUNK_MAX = 64 << 10, 4 << 20
+CHUNK_TARGET = 0.25
+
+# ZIP members are inflated in worker processes, EXTRACT_CHUNK at a time, once
+# an archive holds EXTRACT_PARALLEL_MIN bytes; a worker (interpreter, archive
+# handle, buffers) needs about EXTRACT_WORKER_MEM
+EXTRACT_CHUNK = 1 << 20
+EXTRACT_PARALLEL_MIN = 64 << 20
+EXTRACT_WORKER_MEM = 64 << 20
+
+# download plans: extracted MBTiles take about ZIP_EXPANSION times their
+# archive; ETAs use the rate of earlier runs (of RATE_MIN_BYTES or more)
+ZIP_EXPANSION = 1.1
+RATES_FILE = "throughput.json"
+RATE_MIN_BYTES = 1 << 20
+
+# --order / a plan's "order": how jobs are scheduled by listed size
+ORDERS = ("catalog", "small-first", "large-first")
+
+# `serve` listens here by default; --mirror-url clients poll a mirror that is
+# still fetching a chart upstream every MIRROR_POLL seconds
+MIRROR_PORT = 8737
+MIRROR_POLL = 5
+MIRROR_TIMEOUT = 30
+
+# max concurrent connections per host (matched on domain suffix); each
+# source adds the hosts it uses in register_source()
+HOST_LIMITS = {}
+
 # ─────────── CLI ───────────
-def cli():
+def cli(argv=None):
     p = argparse.ArgumentParser(
         description="Download files from The Chart Locker or Sailing Grace"
     )
+    p.add_argument(
+        "command",
+        nargs="?",
+        choices=["download", "sync", "verify", "list", "search", "serve"],
+        default="download",
+        help="download: pick and fetch charts (default); "
+             "sync: re-fetch tracked charts that changed upstream; "
+             "verify: integrity-check the .mbtiles under --charts-dir; "
+             "list: print regions (or the files of --region) from the cached catalog; "
+             "search: find files by area, name, notes or size across all catalogs; "
+             "serve: share --charts-dir and the catalogs with --mirror-url clients"
+    )
+    p.add_argument(
+        "terms",
+        nargs="*",
+        metavar="QUERY",
+        help="Search terms for the search command, e.g. 'tuamotu' or 'fiji <500MB'"
+    )
     p.add_argument(
         "--charts-dir",
         default=os.getcwd(),
@@ -35,20 +133,207 @@ def cli():
     )
     p.add_argument(
         "--source",
-        choices=["chartlocker", "savinggrace"],
+        choices=list(SOURCES) + ["all"],
+        default=None,
+        help=f"Source site: {', '.join(SOURCES)} or all (if omitted, will prompt)"
+    )
+    p.add_argument(
+        "--cache-dir",
+        default=CACHE_DIR,
+        help=f"Where parsed catalogs are cached between runs (default: {CACHE_DIR})"
+    )
+    p.add_argument(
+        "--cache-ttl",
+        type=int,
+        default=24 * 3600,
+        help="Seconds a cached catalog is used without asking the site (default: 86400)"
+    )
+    cache = p.add_mutually_exclusive_group()
+    cache.add_argument(
+        "--offline",
+        action="store_true",
+        help="Use only the cached catalog; never contact the catalog site"
+    )
+    cache.add_argument(
+        "--refresh",
+        action="store_true",
+        help="Ignore the cached catalog and download and parse the page again"
+    )
+    p.add_argument(
+        "--parser",
+        choices=["auto", "lxml", "html.parser"],
+        default="auto",
+        help="HTML parser for the catalog pages (default: lxml if installed)"
+    )
+    p.add_argument(
+        "--region",
+        action="append",
+        help="Region to download without prompting (repeatable; needs --source)"
+    )
+    p.add_argument(
+        "--all-regions",
+        action="store_true",
+        help="Download from every region of --source without prompting"
+    )
+    p.add_argument(
+        "--select",
+        help="Files to download from each region, e.g. '3,5-9' or '*' (skips the file prompt)"
+    )
+    p.add_argument(
+        "--plan",
+        help="JSON or YAML plan listing sources, regions and area patterns to download"
+    )
+    p.add_argument(
+        "--mirror",
+        action="store_true",
+        help="Download every file of every region (of --source, or of all sources)"
+    )
+    p.add_argument(
+        "--order",
+        choices=ORDERS,
+        help="Schedule downloads by listed size (default: the plan's order, "
+             "else catalog order)"
+    )
+    p.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Print the download plan (sync: the changed and removed charts) "
+             "without downloading"
+    )
+    p.add_argument(
+        "--max-bytes",
+        type=parse_size,
+        default=None,
+        metavar="SIZE",
+        help="Download at most SIZE in this run, e.g. 2G"
+    )
+    p.add_argument(
+        "--reserve-free",
+        type=parse_size,
+        default=None,
+        metavar="SIZE",
+        help="Disk space to leave free under --charts-dir, e.g. 5G"
+    )
+    p.add_argument(
+        "--trim",
+        action="store_true",
+        help="When the picks exceed --max-bytes or the disk space, download the ones that "
+             "fit instead of refusing"
+    )
+    p.add_argument(
+        "--no-verify",
+        action="store_true",
+        help="Skip the integrity check of downloaded .mbtiles files"
+    )
+    p.add_argument(
+        "--verify-jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Processes used to verify .mbtiles files (default: one per CPU)"
+    )
+    p.add_argument(
+        "--link-mode",
+        choices=list(LINKERS),
+        default="hardlink",
+        help="How area folders share files kept in the content store; later modes are "
+             "fallbacks (default: hardlink)"
+    )
+    p.add_argument(
+        "--no-store",
+        action="store_true",
+        help="Don't deduplicate charts through the content store in <charts-dir>/.store"
+    )
+    p.add_argument(
+        "--jobs", "-j",
+        type=int,
+        default=1,
+        help="Number of files to resolve and download at once (default: 1)"
+    )
+    p.add_argument(
+        "--segments",
+        type=int,
+        default=1,
+        help="Split each large file into N byte ranges fetched in parallel (default: 1)"
+    )
+    p.add_argument(
+        "--stream-zip",
+        action="store_true",
+        help="Extract ZIP archives while they download instead of after (halves peak disk use)"
+    )
+    p.add_argument(
+        "--extract-jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Processes used to extract ZIP members, shared by all downloads "
+             "(default: one per CPU)"
+    )
+    p.add_argument(
+        "--extract-memory",
+        type=parse_size,
+        default=None,
+        metavar="SIZE",
+        help="Memory budget for the extraction processes, e.g. 256M; fewer are "
+             "started if needed (about 64M each)"
+    )
+    p.add_argument(
+        "--fsync-every",
+        type=parse_size,
+        default=None,
+        metavar="SIZE",
+        help="Flush downloads to disk every SIZE bytes (e.g. 64M), so an interrupted "
+             "download resumes from what is safely on the card even after a power cut"
+    )
+    p.add_argument(
+        "--limit-rate",
+        type=parse_size,
         default=None,
-        help="Source site: chartlocker or savinggrace (if omitted, will prompt)"
+        help="Global bandwidth cap shared by all workers, e.g. 500K or 2M (bytes/sec)"
     )
-    return p.parse_args()
+    p.add_argument(
+        "--mirror-url",
+        metavar="URL",
+        help="A chartbutler `serve` mirror on the LAN to take catalogs and charts from "
+             "before going to the sources, e.g. http://nav-pc:8737/"
+    )
+    p.add_argument(
+        "--bind",
+        default="0.0.0.0",
+        help="serve: address to listen on (default: all interfaces)"
+    )
+    p.add_argument(
+        "--port",
+        type=int,
+        default=MIRROR_PORT,
+        help=f"serve: port to listen on (default: {MIRROR_PORT})"
+    )
+    p.add_argument(
+        "--metrics-file",
+        metavar="FILE",
+        help="Append per-phase timings (page fetch, parse, resolve, transfer, "
+             "extract, verify) to FILE as JSON lines"
+    )
+    p.add_argument(
+        "--profile",
+        nargs="?",
+        const="",
+        metavar="FILE",
+        help="Run under cProfile and print the hottest functions; "
+             "with FILE, also save the raw stats there"
+    )
+    # intermixed, so options may follow the search terms
+    args = p.parse_intermixed_args(argv)
+    if args.terms and args.command != "search":
+        p.error(f"unexpected arguments for {args.command}: {' '.join(args.terms)}")
+    return args
     
 def pick_source():
     """
     Prompt user to select a source if not provided via CLI.
     """
-    sources = ["chartlocker", "savinggrace"]
+    sources = list(SOURCES) + ["all"]
     print("\nAVAILABLE SOURCES")
     for i, src in enumerate(sources, 1):
-        print(f"  {i}. {src}")
+        print(f"  {i}. {src}" + (f"  ({SOURCES[src].title})" if src in SOURCES else "  (every source)"))
     while True:
         ans = input("Select source # or name > ").strip()
         if ans.isdigit() and 1 <= int(ans) <= len(sources):
@@ -71,13 +356,244 @@ def make_session(a):
         backoff_factor=1,
         allowed_methods=["HEAD", "GET", "OPTIONS"]
     )
-    adapter = HTTPAdapter(max_retries=retry_strategy)
+    jobs = max(1, getattr(a, "jobs", 1))
+    segments = max(1, getattr(a, "segments", 1))
+    adapter = HTTPAdapter(max_retries=retry_strategy,
+                          pool_maxsize=max(10, jobs * max(2, segments)))
     s.mount("https://", adapter)
     s.mount("http://", adapter)
+    # shared by every worker thread: per-host slots and the global rate cap
+    s.host_limits = HostLimiter(HOST_LIMITS, default=jobs)
+    s.throttle = Throttle(a.limit_rate) if getattr(a, "limit_rate", None) else None
+    s.segments = segments
+    s.stream_zip = getattr(a, "stream_zip", False)
+    s.fsync_every = getattr(a, "fsync_every", None)
+    s.extractor = ExtractPool(getattr(a, "extract_jobs", 1), getattr(a, "extract_memory", None))
+    s.html_parser = html_parser(getattr(a, "parser", "auto"))
+    mirror = getattr(a, "mirror_url", None)
+    s.mirror = mirror.rstrip("/") + "/" if mirror else None
+    if getattr(a, "cache_dir", None):
+        s.mediafire_resolver = MediafireResolver(s, a.cache_dir)
+    s.metrics = Metrics(getattr(a, "metrics_file", None))
+    s.hooks["response"].append(s.metrics.on_response)
     return s
 
+# ───── concurrency ─────
+class HostLimiter:
+    """
+    Per-host connection slots. Hosts are matched on domain suffix, so
+    download1234.mediafire.com shares the mediafire.com limit.
+    """
+    def __init__(self, limits, default=1):
+        self.limits = limits
+        self.default = max(1, default)
+        self.sems = {}
+        self.lock = threading.Lock()
+
+    def slot(self, url):
+        host = (urlparse(url).hostname or "").lower()
+        key = next((d for d in self.limits if on_domain(url, d)), host)
+        with self.lock:
+            if key not in self.sems:
+                self.sems[key] = threading.BoundedSemaphore(self.limits.get(key, self.default))
+            return self.sems[key]
+
+class Throttle:
+    """
+    Global bytes/sec cap shared by all workers. Each caller reserves
+    transmission time on a common virtual clock and sleeps until it is due.
+    """
+    def __init__(self, rate):
+        self.rate = float(rate)
+        self.due = time.monotonic()
+        self.lock = threading.Lock()
+
+    def consume(self, n):
+        with self.lock:
+            now = time.monotonic()
+            self.due = max(self.due, now)
+            wait = self.due - now
+            self.due += n / self.rate
+        if wait > 0:
+            time.sleep(wait)
+
+def process_pool(workers):
+    """
+    A pool of `workers` processes. They are spawned, never forked: forking
+    while download threads run could copy locks in their held state.
+    """
+    # multiprocessing is slow to import, so only runs that need a pool pay for it
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    return ProcessPoolExecutor(max_workers=workers,
+                               mp_context=multiprocessing.get_context("spawn"))
+
+def on_domain(url, domain):
+    """
+    Whether url's host is domain or one of its subdomains.
+    """
+    host = (urlparse(url).hostname or "").lower()
+    return host == domain or host.endswith("." + domain)
+
+def host_slot(url, s):
+    """
+    Return a context manager holding a connection slot for url's host.
+    """
+    limits = getattr(s, "host_limits", None)
+    return limits.slot(url) if limits else threading.Lock()
+
+# ───── metrics ─────
+class Metrics:
+    """
+    Per-phase timings for one run: page fetches, HTML parsing, MediaFire
+    resolution, transfers, extraction and verification. phase() yields a
+    record the timed code fills in (bytes, ttfb, strategy, ...); finished
+    records are kept for summary() and appended to a JSON-lines file when
+    one is given. A response hook charges the adapter's retries to
+    whichever phase is running on that thread.
+    """
+    def __init__(self, path=None):
+        self.records = []
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.fp = open(path, "a", encoding="utf-8") if path else None
+
+    @contextmanager
+    def phase(self, name, **fields):
+        rec = {"phase": name, **fields}
+        stack = self.local.__dict__.setdefault("stack", [])
+        stack.append(rec)
+        rec["start"] = time.time()
+        t0 = time.perf_counter()
+        try:
+            yield rec
+        except BaseException as e:
+            rec["error"] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            stack.pop()
+            rec["seconds"] = round(time.perf_counter() - t0, 6)
+            if rec.get("bytes") and rec["seconds"]:
+                rec["bytes_per_s"] = round(rec["bytes"] / rec["seconds"])
+            with self.lock:
+                self.records.append(rec)
+                if self.fp:
+                    self.fp.write(json.dumps(rec) + "\n")
+                    self.fp.flush()
+
+    def on_response(self, r, *args, **kwargs):
+        """
+        requests response hook: count urllib3 retries behind this response.
+        """
+        retries = getattr(getattr(r.raw, "retries", None), "history", None)
+        stack = getattr(self.local, "stack", None)
+        if retries and stack:
+            stack[-1]["retries"] = stack[-1].get("retries", 0) + len(retries)
+
+    def summary(self):
+        """
+        Print one row per phase (count, time, retries, bytes, rate) and the
+        MediaFire strategies that answered.
+        """
+        with self.lock:
+            records = list(self.records)
+        if not records:
+            return
+        rows, phases = [], {}
+        for rec in records:
+            phases.setdefault(rec["phase"], []).append(rec)
+        for name, recs in phases.items():
+            secs = sum(r["seconds"] for r in recs)
+            nbytes = sum(r.get("bytes", 0) for r in recs)
+            rows.append((name, len(recs), sum("error" in r for r in recs),
+                         f"{secs:.2f}", f"{secs / len(recs):.3f}",
+                         sum(r.get("retries", 0) for r in recs),
+                         human_bytes(nbytes) if nbytes else "",
+                         f"{human_bytes(int(nbytes / secs))}/s" if nbytes and secs else ""))
+        print("\nRUN METRICS")
+        print(tabulate(rows, headers=["Phase", "Count", "Errors", "Total s", "Mean s",
+                                      "Retries", "Bytes", "Rate"], tablefmt="rounded_grid",
+                       disable_numparse=True))
+        strategies = {}
+        for rec in phases.get("resolve", ()):
+            if rec.get("strategy"):
+                strategies[rec["strategy"]] = strategies.get(rec["strategy"], 0) + 1
+        if strategies:
+            print("MediaFire links resolved via: " +
+                  ", ".join(f"{k} ×{v}" for k, v in sorted(strategies.items())))
+
+    def close(self):
+        if self.fp:
+            self.fp.close()
+            self.fp = None
+
+def phase(s, name, **fields):
+    """
+    Time a phase on s's metrics; yields a throwaway dict when there are none.
+    """
+    metrics = getattr(s, "metrics", None)
+    return metrics.phase(name, **fields) if metrics else nullcontext({})
+
+def run_profiled(fn, out=None, top=30):
+    """
+    Run fn() under cProfile and print the hottest functions by own time;
+    with out, also dump the raw stats for pstats/snakeviz. Worker threads
+    get a profiler each, since before 3.12 cProfile only sees the thread
+    that enabled it.
+    """
+    import cProfile, pstats
+    profiles = [cProfile.Profile()]
+    lock = threading.Lock()   # guards profiles
+
+    def per_thread(*args):
+        sys.setprofile(None)
+        prof = cProfile.Profile()
+        try:
+            prof.enable()
+        except ValueError:
+            return   # 3.12+: the main profiler already covers every thread
+        with lock:
+            profiles.append(prof)
+
+    threading.setprofile(per_thread)
+    profiles[0].enable()
+    try:
+        return fn()
+    finally:
+        profiles[0].disable()
+        threading.setprofile(None)
+        stats = pstats.Stats(profiles[0], stream=sys.stderr)
+        with lock:
+            extra = profiles[1:]
+        for prof in extra:
+            stats.add(prof)
+        if out:
+            stats.dump_stats(out)
+            print(f"Profile written to {out}", file=sys.stderr)
+        stats.sort_stats("tottime", "cumulative").print_stats(top)
+
 # ───── helpers ─────
-def soup(url,s): r=s.get(url,timeout=60); r.raise_for_status(); return bs4.BeautifulSoup(r.text,"html.parser")
+def soup(url,s):
+    with phase(s, "page", url=url) as m:
+        r=s.get(url,timeout=60); r.raise_for_status()
+        m.update(ttfb=r.elapsed.total_seconds(), bytes=len(r.content))
+    return make_soup(r.text,s)
+def html_parser(choice="auto"):
+    """
+    bs4 tree builder for the catalog pages: lxml when installed (several
+    times faster on the large pages), otherwise the stdlib html.parser.
+    """
+    if choice != "auto":
+        return choice
+    try:
+        import lxml  # noqa: F401
+        return "lxml"
+    except ImportError:
+        return "html.parser"
+def make_soup(text, s=None):
+    parser = getattr(s, "html_parser", None) or html_parser()
+    with phase(s, "parse", parser=parser, chars=len(text)):
+        return bs4.BeautifulSoup(text, parser)
 def slugify(t):  return re.sub(r'[^\w\- ]','_',t).strip()
 def td_notes(tds):
     for txt in reversed(tds):
@@ -85,6 +601,20 @@ def td_notes(tds):
             return txt
     return ""
 def human_size(tok): return tok if re.search(r'\d',tok) else ""
+def parse_size(tok):
+    """
+    Parse '850 MB', '1.2GB', '500K' or a plain byte count into bytes.
+    """
+    m = re.match(r'^\s*(\d+(?:\.\d+)?)\s*([KMGT]?)(?:i?B)?\s*$', str(tok), flags=re.I)
+    if not m:
+        raise argparse.ArgumentTypeError(f"invalid size '{tok}'")
+    mult = 1024 ** " KMGT".index(m.group(2).upper() or " ")
+    return int(float(m.group(1)) * mult)
+def log(msg):
+    """
+    Print a status line without tearing the progress bars of other workers.
+    """
+    tqdm.tqdm.write(msg)
 def landing_filename(url):
     """
     Return a suitable filename for the download URL.
@@ -105,8 +635,8 @@ def landing_filename(url):
     return 'file'
 
 # ───── scrape page ─────
-def scrape(sess):
-    doc=soup(BASE,sess)
+def scrape(sess, doc=None):
+    if doc is None: doc=soup(BASE,sess)
     tree={}; region=None; buf=[]
     skip={"the chart locker","other resources","how to use these files"}
     for tag in doc.find_all(["h2","table"]):
@@ -117,72 +647,79 @@ def scrape(sess):
     if region and buf: tree[region]=parse_region(buf)
     return {r:rows for r,rows in tree.items() if rows and r.lower() not in skip}
 
-def scrape_savinggrace(sess):
+def scrape_savinggrace(sess, doc=None):
     """
     Scrape charts from https://sailingamazinggrace.com/charts.
     Returns dict mapping region labels to list of (area, url, size, note).
     """
-    SAVE_URL = "https://sailingamazinggrace.com/charts"
-    doc = soup(SAVE_URL, sess)
-    regions = {}
-    hrs = doc.find_all("hr", id=True)
-    for idx, hr in enumerate(hrs):
-        # top‑level region
-        h2 = hr.find_next("h2")
-        if not h2:
-            continue
-        region_label = h2.get_text(strip=True)
-        # limit to this region
-        next_hr = hrs[idx+1] if idx+1 < len(hrs) else None
-        rows = []
-        elem = hr
-        current_sub = None
-        current_zoom = ""
-        # walk through elements until next region
-        while True:
-            elem = elem.find_next()
-            if elem is None or elem == next_hr:
-                break
-            # detect subregion headings
-            if getattr(elem, 'name', None) == 'h3':
-                text = elem.get_text(strip=True)
-                # extract zoom in parentheses
-                m = re.match(r"(.+?)\s*\((.+?)\)", text)
-                if m:
-                    current_sub = m.group(1).strip()
-                    current_zoom = m.group(2).strip()
-                else:
-                    current_sub = text
-                    current_zoom = ""
+    if doc is None:
+        doc = soup(SAVE_URL, sess)
+    # one pass in document order: each <hr id> opens a region that is named
+    # by the next <h2> and collects the <li class="row"> entries until the
+    # next <hr id>
+    opened = []      # [label, rows] per region, in page order
+    unnamed = []     # regions still waiting for their <h2>
+    region = None
+    current_sub = None
+    current_zoom = ""
+    for elem in doc.find_all(["hr", "h2", "h3", "li"]):
+        name = elem.name
+        if name == "hr":
+            if elem.get("id") is None:
                 continue
-            # chart rows
-            if getattr(elem, 'name', None) == 'li' and 'row' in elem.get('class', []):
-                # area name
-                area_div = elem.find('div', class_='area')
-                area_txt = area_div.get_text(strip=True) if area_div else ''
-                # creation date
-                created_div = elem.find('div', class_='created')
-                created = created_div.get_text(strip=True) if created_div else ''
-                # assemble note with zoom
-                if current_zoom:
-                    note = f"{created} ({current_zoom})" if created else f"{current_zoom}"
-                else:
-                    note = created
-                # full area path: subregion / area
-                if current_sub:
-                    area_full = f"{current_sub} / {area_txt}"
-                else:
-                    area_full = area_txt
-                # each map column
-                for j, mp in enumerate(elem.find_all('div', class_='map')):
-                    a = mp.find('a', href=True)
-                    if not a:
-                        continue
-                    url = a['href']
-                    size = a.get_text(strip=True)
-                    rows.append((area_full, url, size, note if j == 0 else ''))
-        if rows:
-            regions[region_label] = rows
+            region = [None, []]
+            opened.append(region)
+            unnamed.append(region)
+            current_sub, current_zoom = None, ""
+        elif name == "h2":
+            if unnamed:
+                label = elem.get_text(strip=True)
+                for r in unnamed:
+                    r[0] = label
+                unnamed = []
+        elif region is None:
+            continue
+        elif name == "h3":
+            # detect subregion headings, extracting zoom in parentheses
+            text = elem.get_text(strip=True)
+            m = re.match(r"(.+?)\s*\((.+?)\)", text)
+            if m:
+                current_sub = m.group(1).strip()
+                current_zoom = m.group(2).strip()
+            else:
+                current_sub = text
+                current_zoom = ""
+        elif "row" in elem.get("class", []):
+            # area name, creation date and map columns in one sweep of the divs
+            area_div = created_div = None
+            maps = []
+            for div in elem.find_all("div"):
+                cls = div.get("class", [])
+                if "area" in cls and area_div is None:
+                    area_div = div
+                if "created" in cls and created_div is None:
+                    created_div = div
+                if "map" in cls:
+                    maps.append(div)
+            area_txt = area_div.get_text(strip=True) if area_div else ''
+            created = created_div.get_text(strip=True) if created_div else ''
+            # assemble note with zoom
+            if current_zoom:
+                note = f"{created} ({current_zoom})" if created else f"{current_zoom}"
+            else:
+                note = created
+            # full area path: subregion / area
+            area_full = f"{current_sub} / {area_txt}" if current_sub else area_txt
+            rows = region[1]
+            for j, mp in enumerate(maps):
+                a = mp.find('a', href=True)
+                if not a:
+                    continue
+                rows.append((area_full, a['href'], a.get_text(strip=True), note if j == 0 else ''))
+    regions = {}
+    for label, rows in opened:
+        if label is not None and rows:
+            regions[label] = rows
     return regions
 
 def parse_region(tables):
@@ -201,13 +738,10 @@ def parse_region(tables):
             header = [th.get_text(strip=True).lower() for th in hdr_tr.find_all(["th", "td"])]
         # Determine which column holds the display name: prefer 'Area', then 'Region', then 'Country'
         area_idx = None
-        # substring matching on header labels
-        if any("area" in h for h in header):
-            area_idx = next(i for i, h in enumerate(header) if "area" in h)
-        elif any("region" in h for h in header):
-            area_idx = next(i for i, h in enumerate(header) if "region" in h)
-        elif any("country" in h for h in header):
-            area_idx = next(i for i, h in enumerate(header) if "country" in h)
+        for label in ("area", "region", "country"):
+            area_idx = next((i for i, h in enumerate(header) if label in h), None)
+            if area_idx is not None:
+                break
 
         # Walk through each data row (one <tr> per group)
         for tr in tbl.find_all("tr"):
@@ -215,27 +749,22 @@ def parse_region(tables):
             links = tr.find_all("a", href=lambda u: u and "mediafire.com" in u)
             if not links: continue
             tds = tr.find_all("td")
+            # each cell's text is extracted once and reused below
+            texts = [td.get_text(" ", strip=True) for td in tds]
+            position = {id(td): i for i, td in enumerate(tds)}
             # collect sizes
-            for td in tds:
-                text = td.get_text(" ", strip=True)
-                for m in re.findall(r"\d+(?:\.\d+)?\s*(?:MB|GB)", text):
-                    all_sizes.append(m)
+            for text in texts:
+                all_sizes.extend(re.findall(r"\d+(?:\.\d+)?\s*(?:MB|GB)", text))
             # extract group note
-            texts = [td.get_text(" ", strip=True) for td in tds]
-            note = td_notes(texts)
             all_counts.append(len(links))
-            all_notes.append(note)
+            all_notes.append(td_notes(texts))
             # extract area_text and url for each link
             for a in links:
-                parent_td = a.find_parent("td")
-                try:
-                    td_idx = tds.index(parent_td)
-                except ValueError:
-                    td_idx = None
+                td_idx = position.get(id(a.find_parent("td")))
                 if area_idx is not None and td_idx == area_idx:
                     area_txt = a.get_text(strip=True)
                 elif area_idx is not None and area_idx < len(tds):
-                    area_txt = tds[area_idx].get_text(" ", strip=True)
+                    area_txt = texts[area_idx]
                 else:
                     area_txt = a.get_text(strip=True)
                 all_links.append((area_txt, a["href"]))
@@ -252,106 +781,411 @@ def parse_region(tables):
             link_idx += 1
     return rows
 
-def mediafire_direct(url, s):
-    orig_url = url
-    # page_url used for HTML fallbacks (preserves '/file_premium/' path)
-    page_url = orig_url
-    # Extract quick key from URL path (element after 'file' or 'file_premium')
-    parts = urlparse(orig_url).path.rstrip('/').split('/')
-    if len(parts) >= 3:
-        quick_key = parts[2]
+# ───── catalog cache ─────
+def read_json(path, default=None):
+    try:
+        with open(path, encoding="utf-8") as fp:
+            return json.load(fp)
+    except (OSError, ValueError):
+        return default
+
+def write_json(path, data):
+    """
+    Atomically replace path with data serialized as JSON. Each thread
+    writes its own temporary file, so concurrent writers of one path never
+    rename each other's half-written copy; the last replace wins.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.{os.getpid()}-{threading.get_ident()}.new"
+    try:
+        with open(tmp, "w", encoding="utf-8") as fp:
+            json.dump(data, fp)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+def catalog_path(source, args):
+    return os.path.join(args.cache_dir, f"catalog-{source}.json")
+
+def catalog_tree(entry):
+    return {r: [tuple(row) for row in rows] for r, rows in entry["tree"].items()}
+
+def cached_catalog(source, args):
+    """
+    The cache entry of source, or None (none yet, or --refresh).
+    """
+    return None if args.refresh else read_json(catalog_path(source, args))
+
+def catalog_current(entry, args):
+    """
+    Whether a cache entry can be used without asking the site.
+    """
+    return bool(entry) and (args.offline or time.time() - entry["fetched"] < args.cache_ttl)
+
+def load_catalog(source, sess, args, pool=None, entry=None):
+    """
+    Return the {region: [(area, url, size, note)]} tree for source.
+    Within --cache-ttl the cached tree is used as is; after that the page is
+    revalidated with If-None-Match/If-Modified-Since and only re-parsed
+    when the server sends a new copy. With a process pool, the page is
+    parsed there instead of on this thread. entry is the cache entry if the
+    caller has read it already.
+    """
+    url, scraper = SOURCES[source].url, SOURCES[source].scrape
+    path = catalog_path(source, args)
+    entry = entry or cached_catalog(source, args)
+    if entry:
+        tree = catalog_tree(entry)
+        if catalog_current(entry, args):
+            return tree
+    elif args.offline:
+        sys.exit(f"No cached catalog for {source} in {args.cache_dir}; run once without --offline")
+    # a LAN mirror has scraped the page for everyone
+    r = mirror_get(sess, "catalog/" + source)
+    if r is not None and r.ok:
+        entry = {"url": r.url, "etag": "", "last_modified": "", "fetched": time.time(),
+                 "tree": r.json()["tree"]}
+        write_json(path, entry)
+        return catalog_tree(entry)
+    headers = {}
+    if entry and entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+    if entry and entry.get("last_modified"):
+        headers["If-Modified-Since"] = entry["last_modified"]
+    with phase(sess, "page", url=url) as m:
+        r = sess.get(url, headers=headers, timeout=60)
+        m.update(ttfb=r.elapsed.total_seconds(), bytes=len(r.content), status=r.status_code)
+    if r.status_code == 304 and entry:
+        entry["fetched"] = time.time()
+        write_json(path, entry)
+        return tree
+    r.raise_for_status()
+    if pool:
+        with phase(sess, "scrape", source=source, worker=True):
+            tree = pool.submit(parse_catalog, scraper, r.text, sess.html_parser).result()
     else:
-        quick_key = None
+        doc = make_soup(r.text, sess)
+        with phase(sess, "scrape", source=source):
+            tree = scraper(sess, doc)
+    write_json(path, {
+        "url": url,
+        "etag": r.headers.get("ETag", ""),
+        "last_modified": r.headers.get("Last-Modified", ""),
+        "fetched": time.time(),
+        "tree": tree,
+    })
+    return tree
+
+# ───── mediafire ─────
+# resolution strategies, tried in this order until one has a track record
+MF_STRATEGIES = ("api", "redirect", "page")
+
+def mf_quick_key(url):
+    """
+    Quick key from a MediaFire page URL (element after 'file' or 'file_premium').
+    """
+    parts = urlparse(url).path.rstrip('/').split('/')
+    return parts[2] if len(parts) >= 3 else None
+
+def mf_download_href(href):
+    """
+    Normalise an anchor href if it points at a MediaFire download server.
+    """
+    if not re.match(r'^(?:https?:)?//download[0-9]*\.mediafire\.com/', href):
+        return None
+    if href.startswith("//"):
+        return "https:" + href
+    return href
+
+def mf_api(page_url, s):
+    """
+    1) MediaFire API direct link, when a logged-in API client is attached.
+    """
     api = getattr(s, 'mediafire_api', None)
-    # 1) Try API direct link if available
-    if api and quick_key:
-        try:
-            # Attempt to use MediaFire API for a permissioned link
-            resp = api.file_get_links(quick_key)
-            # resp is the parsed 'response' dict from the API
-            # Extract the 'links' wrapper
-            wrapper = resp.get('links')
-            if wrapper:
-                # In some responses, links may be nested under 'link'
-                entries = None
-                if isinstance(wrapper, dict) and 'link' in wrapper:
-                    entries = wrapper['link']
-                else:
-                    entries = wrapper
-                # Normalize to list
-                if isinstance(entries, dict):
-                    entries = [entries]
-                if isinstance(entries, list) and entries:
-                    first = entries[0]
-                    for key in ('direct_download', 'download_url'):
-                        val = first.get(key)
-                        if val:
-                            print(f"⇱ [MediaFire API] using direct link: {val}")
-                            return val
-            # no usable links found
-            print(f"⚠ [MediaFire API] no download links in response, keys: {list(resp.keys())}")
-        except Exception as e:
-            print(f"⚠ [MediaFire API] error fetching links for key {quick_key}: {e}")
-    # 2) Premium redirect fallback (for '/file_premium/' URLs)
+    quick_key = mf_quick_key(page_url)
+    if not (api and quick_key):
+        return None
+    try:
+        # Attempt to use MediaFire API for a permissioned link
+        resp = api.file_get_links(quick_key)
+        # resp is the parsed 'response' dict from the API
+        # Extract the 'links' wrapper
+        wrapper = resp.get('links')
+        if wrapper:
+            # In some responses, links may be nested under 'link'
+            entries = None
+            if isinstance(wrapper, dict) and 'link' in wrapper:
+                entries = wrapper['link']
+            else:
+                entries = wrapper
+            # Normalize to list
+            if isinstance(entries, dict):
+                entries = [entries]
+            if isinstance(entries, list) and entries:
+                first = entries[0]
+                for key in ('direct_download', 'download_url'):
+                    val = first.get(key)
+                    if val:
+                        log(f"⇱ [MediaFire API] using direct link: {val}")
+                        return val
+        # no usable links found
+        log(f"⚠ [MediaFire API] no download links in response, keys: {list(resp.keys())}")
+    except Exception as e:
+        log(f"⚠ [MediaFire API] error fetching links for key {quick_key}: {e}")
+    return None
+
+def mf_redirect(page_url, s):
+    """
+    2) Premium redirect (for '/file_premium/' URLs): HEAD without following.
+    """
     try:
-        # HEAD request to capture direct-download redirect without following
         resp = s.head(page_url, allow_redirects=False, timeout=60)
         if resp.status_code in (301, 302, 303, 307, 308):
             loc = resp.headers.get('Location')
             if loc:
-                print(f"⇱ [Premium redirect] using direct link: {loc}")
+                log(f"⇱ [Premium redirect] using direct link: {loc}")
                 return loc
     except Exception:
         pass
-    # 3) HTML regex fallback (unauthenticated or API fallback)
-    try:
-        page = s.get(page_url, timeout=60).text
-        m = re.search(r'href=["\'](https://download[^"\']+)["\']', page)
-        if m:
-            fallback = m.group(1)
-            print(f"⇱ [HTML regex] fallback link: {fallback}")
-            return fallback
-    except Exception:
-        pass
-    # 3) Fallback: scrape HTML for download link using a browser UA
-    orig_ua = s.headers.get("User-Agent")
+    return None
+
+def mf_page(page_url, s):
+    """
+    3) Fetch the landing page once with a browser UA, then try the cheap
+    regex before falling back to a full HTML scrape of the same body.
+    """
+    # the UA is passed per request: the session is shared by concurrent workers
+    page = s.get(page_url, headers={"User-Agent": BROWSER_UA}, timeout=60).text
+    m = re.search(r'href=["\'](https://download[^"\']+)["\']', page)
+    if m:
+        log(f"⇱ [HTML regex] fallback link: {m.group(1)}")
+        return m.group(1)
+    soup_page = make_soup(page, s)
+    # look for download button anchor, then any link to a download server
+    anchors = soup_page.find_all("a", id=lambda x: x and "download" in x.lower())
+    anchors += soup_page.find_all("a", href=True)
+    for a_tag in anchors:
+        href = (a_tag.get("href") or "").strip()
+        link = mf_download_href(href) if href != "#" else None
+        if link:
+            log(f"⇱ [HTML scrape] fallback link: {link}")
+            return link
+    return None
+
+MF_RESOLVERS = {"api": mf_api, "redirect": mf_redirect, "page": mf_page}
+
+def mediafire_resolve(url, s, order=MF_STRATEGIES):
+    """
+    Run the resolution strategies in order; return (direct link, strategy).
+    """
+    with phase(s, "resolve", url=url) as m:
+        m["tried"] = []
+        for name in order:
+            m["tried"].append(name)
+            try:
+                link = MF_RESOLVERS[name](url, s)
+            except requests.RequestException:
+                link = None
+            if link:
+                m["strategy"] = name
+                return link, name
+        # no direct link found
+        raise RuntimeError(f"Direct link not found for {url}")
+
+class MediafireResolver:
+    """
+    Resolves MediaFire page URLs to download*.mediafire.com links, caching
+    them by quick key until they expire and remembering which strategy
+    works so it is tried first next time. Persisted as JSON in the cache dir.
+    """
+    TTL = 3600   # direct links are signed and go stale; re-resolve after this
+
+    def __init__(self, sess, cache_dir):
+        self.sess = sess
+        self.path = os.path.join(cache_dir, "mediafire-links.json")
+        data = read_json(self.path, {})
+        now = time.time()
+        self.links = {k: v for k, v in data.get("links", {}).items() if v["expires"] > now}
+        self.wins = data.get("strategies", {})
+        self.lock = threading.Lock()
+        self.save_lock = threading.Lock()   # snapshots reach the disk in order
+
+    def order(self):
+        return sorted(MF_STRATEGIES, key=lambda n: -self.wins.get(n, 0))
+
+    def save(self):
+        with self.save_lock:
+            with self.lock:
+                data = {"links": dict(self.links), "strategies": dict(self.wins)}
+            write_json(self.path, data)
+
+    def resolve(self, url, save=True):
+        key = mf_quick_key(url) or url
+        with self.lock:
+            hit = self.links.get(key)
+        if hit and hit["expires"] > time.time():
+            with phase(self.sess, "resolve", url=url, strategy="cache"):
+                return hit["url"]
+        with host_slot(url, self.sess):
+            link, strategy = mediafire_resolve(url, self.sess, self.order())
+        with self.lock:
+            self.links[key] = {"url": link, "strategy": strategy,
+                               "expires": time.time() + self.TTL}
+            self.wins[strategy] = self.wins.get(strategy, 0) + 1
+        if save:
+            self.save()
+        return link
+
+    def invalidate(self, url):
+        with self.lock:
+            self.links.pop(mf_quick_key(url) or url, None)
+
+    def resolve_all(self, urls, workers=8):
+        """
+        Resolve every url concurrently (per-host limits still apply).
+        Returns {url: link}; failures are left out and retried at download.
+        The cache is saved once, at the end.
+        """
+        urls = list(dict.fromkeys(urls))
+        out = {}
+        if not urls:
+            return out
+        with ThreadPoolExecutor(max_workers=min(workers, len(urls))) as ex:
+            futs = {ex.submit(self.resolve, u, False): u for u in urls}
+            for fut in as_completed(futs):
+                try:
+                    out[futs[fut]] = fut.result()
+                except Exception as e:
+                    log(f"⚠ could not resolve {futs[fut]}: {e}")
+        self.save()
+        return out
+
+def mediafire_direct(url, s, fresh=False):
+    resolver = getattr(s, "mediafire_resolver", None)
+    if resolver:
+        if fresh:
+            resolver.invalidate(url)
+        return resolver.resolve(url)
+    with host_slot(url, s):
+        return mediafire_resolve(url, s)[0]
+
+def mediafire_direct_all(urls, s):
+    """
+    Resolve MediaFire links ahead of their downloads, into the link cache.
+    """
+    resolver = getattr(s, "mediafire_resolver", None)
+    if resolver:
+        resolver.resolve_all(urls, workers=HOST_LIMITS["mediafire.com"])
+
+# ───── sources ─────
+# a chart site: its catalog page and scraper, how catalog links become
+# download URLs (None: they already are), the folder its charts land in,
+# connection limits for its hosts and an optional batch resolver
+Source = namedtuple("Source", "name title url scrape resolve folder hosts resolve_all")
+
+SOURCES = {}
+
+def register_source(name, title, url, scrape, resolve=None, folder=None, hosts=None,
+                    resolve_all=None):
+    """
+    Add a chart site. scrape(sess, doc) turns the parsed catalog page into
+    {region: [(area, link, size, note)]}; it must be a module-level
+    function, as pages are parsed in worker processes. resolve(link, sess,
+    fresh=False) returns the download URL of a catalog link, with fresh
+    bypassing any cache. folder defaults to the title without spaces.
+    hosts caps concurrent connections per domain (others get --jobs), and
+    resolve_all(links, sess), if given, resolves the links of a run before
+    their downloads start.
+    """
+    hosts = hosts or {}
+    for domain, limit in hosts.items():
+        HOST_LIMITS[domain] = min(limit, HOST_LIMITS.get(domain, limit))
+    SOURCES[name] = Source(name, title, url, scrape, resolve,
+                           folder or re.sub(r"\W", "", title), hosts, resolve_all)
+
+register_source("chartlocker", "The Chart Locker", BASE, scrape, mediafire_direct, "ChartLocker",
+                hosts={"chartlocker.brucebalan.com": 2, "mediafire.com": 4},
+                resolve_all=mediafire_direct_all)
+register_source("savinggrace", "Sailing Grace", SAVE_URL, scrape_savinggrace, folder="SavingGrace",
+                hosts={"sailingamazinggrace.com": 2})
+
+def source_names(source):
+    """
+    The sources a --source value stands for: all of them for "all" (or
+    None, where no prompt applies), else just that one.
+    """
+    return list(SOURCES) if source in (None, "all") else [source]
+
+def resolve_link(source, link, sess, fresh=False):
+    """
+    The download URL of a catalog link of source: the LAN mirror's answer
+    when there is one (it caches resolutions for every client), else the
+    source's resolver. fresh bypasses both caches.
+    """
+    resolve = SOURCES[source].resolve
+    if resolve is None:
+        return link
+    r = None if fresh else mirror_get(sess, "resolve", source=source, link=link)
+    if r is not None and r.ok:
+        return r.json()["url"]
+    return resolve(link, sess, fresh=fresh)
+
+def parse_catalog(scrape, text, parser):
+    """
+    Parse a catalog page and scrape it; runs in a catalog worker process.
+    """
+    return scrape(None, bs4.BeautifulSoup(text, parser))
+
+def warm_parser():
+    """
+    Import the HTML stack in a catalog worker while the pages download.
+    """
+    return bs4.BeautifulSoup is not None
+
+def load_catalogs(sources, sess, args):
+    """
+    load_catalog() for several sources at once, as {source: tree}. Pages
+    are fetched on threads and, when more than one needs parsing and there
+    are CPUs to spare, parsed in worker processes (started while the pages
+    download), so the wait is about that of the slowest source rather
+    than the sum.
+    """
+    entries = {src: cached_catalog(src, args) for src in sources}
+    sources = list(entries)
+    stale = [src for src in sources if not catalog_current(entries[src], args)]
+    workers = min(len(stale), os.cpu_count() or 1)
+    pool = None
+    if workers > 1 and not args.offline:
+        pool = process_pool(workers)
+        for _ in range(workers):
+            pool.submit(warm_parser)
     try:
-        s.headers["User-Agent"] = (
-            "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-            "AppleWebKit/537.36 (KHTML, like Gecko) "
-            "Chrome/115.0.0.0 Safari/537.36"
-        )
-        page = s.get(page_url, timeout=60).text
+        with ThreadPoolExecutor(max_workers=max(1, len(sources))) as ex:
+            trees = list(ex.map(lambda src: load_catalog(src, sess, args, pool, entries[src]),
+                                 sources))
     finally:
-        if orig_ua is not None:
-            s.headers["User-Agent"] = orig_ua
-    soup_page = bs4.BeautifulSoup(page, "html.parser")
-    # look for download button anchor
-    for a_tag in soup_page.find_all("a", id=lambda x: x and "download" in x.lower()):
-        href = a_tag.get("href")
-        if not href or href.strip() == "#":
-            continue
-        if re.match(r'^(?:https?:)?//download[0-9]*\.mediafire\.com/', href):
-            link = href
-            if link.startswith("//"):
-                link = "https:" + link
-            elif link.startswith("/"):
-                link = "https://www.mediafire.com" + link
-            print(f"⇱ [HTML scrape] fallback link: {link}")
-            return link
-    # fallback: any link to download server
-    for a_tag in soup_page.find_all("a", href=True):
-        href = a_tag["href"]
-        if re.match(r'^(?:https?:)?//download[0-9]+\.mediafire\.com/', href):
-            link = href
-            if link.startswith("//"):
-                link = "https:" + link
-            elif link.startswith("/"):
-                link = "https://www.mediafire.com" + link
-            print(f"⇱ [HTML scrape] fallback link: {link}")
-            return link
-    # no direct link found
-    raise RuntimeError(f"Direct link not found for {page_url}")
+        if pool:
+            pool.shutdown()
+    return dict(zip(sources, trees))
+
+def unified_catalog(trees):
+    """
+    Every row of {source: tree} as one list of (source, region, row).
+    """
+    return [(source, region, row) for source, tree in trees.items()
+            for region, rows in tree.items() for row in rows]
+
+def merge_regions(trees):
+    """
+    {region: [(source, row)]}: regions of the same name from several
+    sources are merged, in source order.
+    """
+    merged = {}
+    for source, region, row in unified_catalog(trees):
+        merged.setdefault(region, []).append((source, row))
+    return merged
 
 # ───── pickers ─────
 def pick_region(regs):
@@ -366,149 +1200,2426 @@ def pick_region(regs):
         if input(f"Did you mean '{guess}'? [Y/n] ").lower() in ("","y"): return guess
 
 def pick_links(files):
+    from rich.console import Console
+    from rich.table import Table
     console = Console()
     term_w  = shutil.get_terminal_size((120, 20)).columns
+    shown = list(range(len(files)))   # row indices on screen, best match first
+    index = None
 
-    tbl = Table(show_lines=True)
-    tbl.add_column("#", style="bold", width=4, justify="right")
-    tbl.add_column("Size", width=10)
-    tbl.add_column("Filename", overflow="fold")      # auto‑wrap
-    tbl.add_column("Area", overflow="fold")
-    tbl.add_column("Notes", overflow="fold")
-
-    for i, (area, link, sz, note) in enumerate(files, 1):
-        tbl.add_row(
-            str(i),
-            sz or "",
-            landing_filename(link),
-            area,
-            note
-        )
+    while True:
+        tbl = Table(show_lines=True)
+        tbl.add_column("#", style="bold", width=4, justify="right")
+        tbl.add_column("Size", width=10)
+        tbl.add_column("Filename", overflow="fold")      # auto‑wrap
+        tbl.add_column("Area", overflow="fold")
+        tbl.add_column("Notes", overflow="fold")
 
-    console.print()
-    console.print(tbl, width=term_w)   # width hint = current terminal
-    console.print()
+        for i in shown:
+            area, link, sz, note = files[i]
+            tbl.add_row(
+                str(i + 1),
+                sz or "",
+                landing_filename(link),
+                area,
+                note
+            )
 
-    raw = console.input("Download which files? (* for all) > ").strip().lower()
+        console.print()
+        console.print(tbl, width=term_w)   # width hint = current terminal
+        console.print()
+
+        raw = console.input("Download which files? (* for all, /text to filter) > ")
+        if not raw.strip().startswith("/"):
+            break
+        # filter in place; numbers keep pointing at the full region table
+        query = raw.strip()[1:]
+        if not query.strip():
+            shown = list(range(len(files)))
+            continue
+        index = index or SearchIndex([(None, None, row) for row in files])
+        hits = index.search(query)
+        if hits:
+            shown = hits
+        else:
+            console.print(f"No files match '{query}'")
+    if raw.strip().lower() in ("*", "all") and len(shown) < len(files):
+        return sorted(shown)
+    return parse_selection(raw, len(files))
+
+def parse_selection(raw, count):
+    """
+    Turn '*', '4-8', '3,5,7' or any mix of them into sorted 0-based indices.
+    """
+    raw = raw.strip().lower()
     # parse selection: support all (*), ranges (e.g., 4-8), lists (e.g., 3,5,7), and single indices
     if raw in ("*", "all"):
-        picks = list(range(len(files)))
-    else:
-        picks = set()
-        for part in re.split(r"[,\\s]+", raw):
-            part = part.strip()
-            if not part:
-                continue
-            # range selection
-            if "-" in part:
-                start_str, end_str = part.split("-", 1)
-                if start_str.isdigit() and end_str.isdigit():
-                    s, e = int(start_str), int(end_str)
-                    for n in range(min(s, e), max(s, e) + 1):
-                        if 1 <= n <= len(files):
-                            picks.add(n - 1)
-            # single index
-            elif part.isdigit():
-                n = int(part)
-                if 1 <= n <= len(files):
-                    picks.add(n - 1)
-        picks = sorted(picks)
-    return picks
-    return list(range(len(files))) if raw in ("*", "all") else [
-        int(x) - 1
-        for x in re.split(r"[,\s]+", raw)
-        if x.isdigit() and 1 <= int(x) <= len(files)
-    ]
+        return list(range(count))
+    picks = set()
+    for part in re.split(r"[,\s]+", raw):
+        part = part.strip()
+        if not part:
+            continue
+        # range selection
+        if "-" in part:
+            start_str, end_str = part.split("-", 1)
+            if start_str.isdigit() and end_str.isdigit():
+                s, e = int(start_str), int(end_str)
+                for n in range(min(s, e), max(s, e) + 1):
+                    if 1 <= n <= count:
+                        picks.add(n - 1)
+        # single index
+        elif part.isdigit():
+            n = int(part)
+            if 1 <= n <= count:
+                picks.add(n - 1)
+    return sorted(picks)
 
+# ───── search ─────
+# results listed by the search command
+SEARCH_LIMIT = 50
 
-# ───── fetch ─────
-def fetch(url,dest,sess,done):
-    fname = os.path.basename(urlparse(url).path)
-    # skip if already downloaded
-    final = os.path.join(dest, fname)
-    if (dest, fname) in done and os.path.exists(final):
-        return
-    done.add((dest, fname))
-    # indicate which file and URL we're downloading
-    print(f"⇣ {fname}  URL: {url}")
-    # download into temporary file
-    tmp = final + ".tmp"
-    with sess.get(url, stream=True, timeout=60) as r:
-        r.raise_for_status()
-        total = int(r.headers.get("content-length", 0))
-        bar = tqdm.tqdm(total=total, unit="B", unit_scale=True)
-        with open(tmp, "wb") as fp:
-            for chunk in r.iter_content(1 << 20):
-                fp.write(chunk)
-                bar.update(len(chunk))
+def search_tokens(text):
+    """
+    Lower-case, accent-free alphanumeric words of text.
+    """
+    text = (text or "").lower()
+    if not text.isascii():
+        text = "".join(c for c in unicodedata.normalize("NFKD", text)
+                       if not unicodedata.combining(c))
+    return re.findall(r"[a-z0-9]+", text)
+
+def trigrams(token):
+    padded = f"${token}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class SearchIndex:
+    """
+    Token and trigram index over catalog rows, built once so each query
+    is a handful of dict lookups. Entries are (source, region, row) and
+    every field is weighted: area and file name rank above region, notes
+    and size. A query word matches a token exactly, as a prefix, or by
+    trigram similarity (typos); '<500MB' or '>1GB' filter on size.
+    """
+    FIELDS = (("area", 3), ("filename", 2), ("region", 1), ("note", 1), ("size", 1))
+    FUZZY = 0.45   # minimum trigram Jaccard similarity for a typo match
+
+    FILE = "search-index.json"
+
+    def __init__(self, entries, postings=None):
+        self.entries = entries
+        if postings is None:
+            postings = self.build(entries)
+        self.postings = postings
+        self.vocab = sorted(postings)
+        self.grams = {}      # trigram -> tokens containing it
+        for tok in self.vocab:
+            for g in trigrams(tok):
+                self.grams.setdefault(g, []).append(tok)
+
+    @classmethod
+    def cached(cls, entries, stamp, cache_dir):
+        """
+        Index for entries, loaded from cache_dir if it was built from the
+        same catalog files (stamp), else built and saved there.
+        """
+        path = os.path.join(cache_dir, cls.FILE)
+        data = read_json(path)
+        if data and data.get("stamp") == stamp:
+            # postings are stored flat: token -> [entry, weight, entry, weight, ...]
+            return cls(entries, {tok: dict(zip(flat[::2], flat[1::2]))
+                                 for tok, flat in data["postings"].items()})
+        index = cls(entries)
+        write_json(path, {"stamp": stamp, "postings": {
+            tok: [x for pair in posting.items() for x in pair]
+            for tok, posting in index.postings.items()}})
+        return index
+
+    @classmethod
+    def build(cls, entries):
+        postings = {}        # token -> {entry: field weight}
+        words = {}           # regions, notes and sizes repeat a lot
+        for n, (source, region, (area, link, size, note)) in enumerate(entries):
+            fields = {"area": area, "filename": landing_filename(link),
+                      "region": region, "note": note, "size": size}
+            for field, weight in cls.FIELDS:
+                text = fields[field]
+                if text not in words:
+                    words[text] = search_tokens(text)
+                for tok in words[text]:
+                    posting = postings.setdefault(tok, {})
+                    if posting.get(n, 0) < weight:
+                        posting[n] = weight
+        return postings
+
+    def expand(self, word):
+        """
+        {token: match quality} for one query word.
+        """
+        found = {word: 1.0} if word in self.postings else {}
+        i = bisect.bisect_left(self.vocab, word)
+        while i < len(self.vocab) and self.vocab[i].startswith(word):
+            found.setdefault(self.vocab[i], 0.8)
+            i += 1
+        if len(word) >= 3:
+            mine, shared = trigrams(word), {}
+            for g in mine:
+                for tok in self.grams.get(g, ()):
+                    shared[tok] = shared.get(tok, 0) + 1
+            for tok, k in shared.items():
+                sim = k / (len(mine) + len(trigrams(tok)) - k)
+                if sim >= self.FUZZY and tok not in found:
+                    found[tok] = 0.6 * sim
+        return found
+
+    def search(self, query):
+        """
+        Entry indices ranked by weighted score, then catalog order. Only
+        rows matching every word are returned, unless there are none.
+        """
+        words, limits = [], []
+        for part in query.split():
+            m = re.match(r"^([<>])=?(.+)$", part)
+            if m and size_bytes(m.group(2)) is not None:
+                limits.append((m.group(1), size_bytes(m.group(2))))
+            else:
+                words += search_tokens(part)
+        scores, hits = {}, {}
+        for word in dict.fromkeys(words):
+            best = {}
+            for tok, quality in self.expand(word).items():
+                for n, weight in self.postings[tok].items():
+                    best[n] = max(best.get(n, 0), quality * weight)
+            for n, score in best.items():
+                scores[n] = scores.get(n, 0) + score
+                hits[n] = hits.get(n, 0) + 1
+        words = list(dict.fromkeys(words))
+        if any(k == len(words) for k in hits.values()):
+            scores = {n: s for n, s in scores.items() if hits[n] == len(words)}
+        ranked = scores if words else dict.fromkeys(range(len(self.entries)), 0)
+        if limits:
+            def fits(n):
+                size = size_bytes(self.entries[n][2][2])
+                return size is not None and all(size < v if op == "<" else size > v
+                                                for op, v in limits)
+            ranked = {n: s for n, s in ranked.items() if fits(n)}
+        return sorted(ranked, key=lambda n: (-hits.get(n, 0), -ranked[n], n))
+
+def search_jobs(args, sess, root):
+    """
+    Rank the rows of every catalog (or of --source) against the search
+    terms, print the best matches and turn the picked ones into jobs:
+    --select picks without prompting, and without a terminal nothing is.
+    """
+    query = " ".join(args.terms)
+    if not query:
+        sys.exit("Nothing to search for, e.g.: chartbutler.py search tuamotu")
+    trees = load_catalogs(source_names(args.source), sess, args)
+    entries = unified_catalog(trees)
+    stamp = {source: os.stat(catalog_path(source, args)).st_mtime_ns for source in trees}
+    t0 = time.perf_counter()
+    ranked = SearchIndex.cached(entries, stamp, args.cache_dir).search(query)
+    took = (time.perf_counter() - t0) * 1000
+    hits = [entries[n] for n in ranked[:SEARCH_LIMIT]]
+    print(f"\n{len(ranked)} match(es) for '{query}' across {len(entries):,} files ({took:.0f} ms)"
+          + (f", showing the best {SEARCH_LIMIT}" if len(ranked) > SEARCH_LIMIT else ""))
+    if not hits:
+        return []
+    print(tabulate([(i, src, region, area, sz, landing_filename(link), note)
+                    for i, (src, region, (area, link, sz, note)) in enumerate(hits, 1)],
+                   headers=["#", "Source", "Region", "Area", "Size", "Filename", "Notes"],
+                   tablefmt="rounded_grid"))
+    if args.select:
+        picks = parse_selection(args.select, len(hits))
+    elif sys.stdin.isatty():
+        picks = parse_selection(input("Download which results? (Enter for none) > "), len(hits))
+    else:
+        picks = []
+    return [job_for(root, *hits[i]) for i in picks]
+
+# ───── plans ─────
+def job_for(root, source, region, row):
+    """
+    Job for one catalog row, landing in
+    <root>/<SourceDir>/<Region>_mbtiles/<area slug>.
+    """
+    area, link, size, note = row
+    region_dir = f"{region.replace(' ','_')}_mbtiles"
+    folder = os.path.join(root, SOURCES[source].folder, region_dir, slugify(area))
+    return Job(source, region, area, link, size, note, folder)
+
+def size_bytes(tok):
+    """
+    Catalog size string in bytes, or None when the listing has no size.
+    """
+    try:
+        return parse_size(tok)
+    except argparse.ArgumentTypeError:
+        return None
+
+def order_jobs(jobs, order):
+    """
+    Schedule jobs by their listed size: 'small-first' for quick wins,
+    'large-first' to keep the link busy; unsized files always go last.
+    """
+    if order == "catalog":
+        return list(jobs)
+    sign = 1 if order == "small-first" else -1
+    return sorted(jobs, key=lambda j: (size_bytes(j.size) is None, sign * (size_bytes(j.size) or 0)))
+
+def load_plan(path):
+    """
+    Read a JSON or YAML plan:
+
+        {"source": "chartlocker", "order": "large-first",
+         "regions": [{"name": "Fiji"},
+                     {"name": "French Polynesia", "areas": ["Tuamotu*"]},
+                     {"source": "savinggrace", "name": "Tonga", "select": "1-4"}]}
+    """
+    with open(path, encoding="utf-8") as fp:
+        if path.lower().endswith((".yml", ".yaml")):
+            try:
+                import yaml
+            except ImportError:
+                sys.exit("YAML plans need PyYAML (pip install pyyaml), or use JSON")
+            return yaml.safe_load(fp) or {}
+        return json.load(fp)
+
+def match_region(name, regions, required=True):
+    """
+    Exact, then case-insensitive region lookup; no prompting. An unknown
+    region exits, or returns None when it isn't required.
+    """
+    if name in regions:
+        return name
+    for r in regions:
+        if r.lower() == name.lower():
+            return r
+    if not required:
+        return None
+    guess, _ = fuzz.extractOne(name, regions)
+    sys.exit(f"Unknown region '{name}' (did you mean '{guess}'?)")
+
+def plan_jobs(args, sess, root):
+    """
+    Build the job list without prompting, from --plan, --mirror,
+    --all-regions or --region/--select. Every catalog is loaded once
+    and all jobs share the one session.
+    """
+    # (source, region or None for all, area patterns, selection, whether
+    # the source must have the region: with "all", one of them must)
+    entries = []
+    if args.plan:
+        plan = load_plan(args.plan)
+        # an explicit --order wins over the plan's
+        if args.order is None and plan.get("order"):
+            if plan["order"] not in ORDERS:
+                sys.exit(f"Plan order must be one of {', '.join(ORDERS)}")
+            args.order = plan["order"]
+        for e in plan.get("regions", []):
+            src = e.get("source") or plan.get("source") or args.source
+            if src not in SOURCES and src != "all":
+                sys.exit(f"Plan entry {e} has no valid source")
+            entries += [(name, e.get("name"), e.get("areas") or ["*"], e.get("select", "*"),
+                         src != "all") for name in source_names(src)]
+    if args.mirror:
+        entries += [(src, None, ["*"], "*", True) for src in source_names(args.source)]
+    if args.all_regions or args.region:
+        if not args.source:
+            sys.exit("--source is required with --region/--all-regions (or --source all)")
+        for src in source_names(args.source):
+            for name in (args.region or [None]):
+                entries.append((src, name, ["*"], args.select or "*", args.source != "all"))
+    trees = load_catalogs(dict.fromkeys(e[0] for e in entries), sess, args)
+    merged = list(merge_regions(trees))
+    for name in {e[1] for e in entries if e[1] and not e[4]}:
+        match_region(name, merged)
+    jobs, seen = [], set()
+    for src, region, areas, select, required in entries:
+        tree = trees[src]
+        regs = [match_region(region, list(tree), required)] if region else list(tree)
+        for reg in filter(None, regs):
+            files = tree[reg]
+            for i in parse_selection(str(select), len(files)):
+                area, link = files[i][0], files[i][1]
+                if not any(fnmatch.fnmatch(area.lower(), p.lower()) or
+                           fnmatch.fnmatch(landing_filename(link).lower(), p.lower()) for p in areas):
+                    continue
+                job = job_for(root, src, reg, files[i])
+                if (job.folder, job.link) not in seen:
+                    seen.add((job.folder, job.link))
+                    jobs.append(job)
+    return jobs
+
+# ───── budget ─────
+class Plan:
+    """
+    What a list of jobs will cost before anything is transferred: bytes to
+    download, disk space at the peak (extracted archives, plus up to --jobs
+    archives waiting to be unpacked) and an ETA from the throughput of
+    earlier runs. settle() holds the plan to --max-bytes and --reserve-free
+    and trims it or refuses to start.
+    """
+    def __init__(self, jobs, sess, args, force=False):
+        self.args = args
+        self.root = os.path.abspath(args.charts_dir)
+        self.workers = max(1, args.jobs)
+        self.costs = []      # (job, bytes to download, bytes kept on disk, archive while unpacked)
+        self.present = 0     # already downloaded
+        self.unsized = 0     # sized neither by the catalog nor by the server, so not counted
+        self.rates = os.path.join(args.cache_dir, RATES_FILE) if args.cache_dir else None
+        self.link = getattr(sess, "mirror", None) or "direct"
+        store = getattr(sess, "store", None)
+        fetched = set()      # store keys of the charts this plan downloads
+        costs = [(job, job_cost(job, sess, force)) for job in jobs]
+        unsized = [i for i, (_, cost) in enumerate(costs) if cost and cost[0] is None]
+        if unsized and not args.offline:
+            # the budgets hold for files the catalog lists without a size too
+            with ThreadPoolExecutor(max_workers=max(4, self.workers)) as ex:
+                sizes = list(ex.map(lambda i: head_size(costs[i][0], sess), unsized))
+            for i, size in zip(unsized, sizes):
+                if size is not None:
+                    job = costs[i][0]
+                    costs[i] = (job, job_cost(job._replace(size=str(size)), sess, force))
+        for job, cost in costs:
+            if cost is None:
+                self.present += 1
+                continue
+            if cost[0] is None:
+                self.unsized += 1
+                cost = (0, 0, 0)
+            elif store and cost[0]:
+                if store.key(job) in fetched:
+                    # picked twice: downloaded once, then placed from the store
+                    cost = (0, cost[1] if store.modes[0] == "copy" else 0, 0)
+                fetched.add(store.key(job))
+            self.costs.append((job,) + cost)
+
+    def totals(self, costs):
+        """
+        (bytes to download, peak disk bytes) of costs.
+        """
+        archives = sorted(c[3] for c in costs)[-self.workers:]
+        return sum(c[1] for c in costs), sum(c[2] for c in costs) + sum(archives)
+
+    def rate(self):
+        """
+        Expected bytes/s: the average of earlier runs over the same link,
+        capped by --limit-rate. None before the first run.
+        """
+        rate = (read_json(self.rates, {}) if self.rates else {}).get(self.link)
+        cap = getattr(self.args, "limit_rate", None)
+        return min(rate or cap, cap or rate) if rate or cap else None
+
+    def record(self, sess, seconds):
+        """
+        Fold the transfer rate of this run into the rate used for ETAs.
+        """
+        nbytes = sum(r.get("bytes", 0) for r in sess.metrics.records if r["phase"] == "fetch")
+        if not self.rates or seconds <= 0 or nbytes < RATE_MIN_BYTES:
+            return
+        rates = read_json(self.rates, {})
+        old = rates.get(self.link)
+        rates[self.link] = nbytes / seconds if old is None else 0.7 * old + 0.3 * nbytes / seconds
+        write_json(self.rates, rates)
+
+    def report(self, costs, trimmed=()):
+        download, disk = self.totals(costs)
+        rate = self.rate()
+        eta = "unknown (no earlier run)" if rate is None else human_duration(download / rate)
+        free = free_space(self.root)
+        print("\nDOWNLOAD PLAN")
+        print(tabulate([(len(costs), human_bytes(download), human_bytes(disk), human_bytes(free), eta)],
+                       headers=["Files", "Download", "Disk needed", "Free", "ETA"],
+                       tablefmt="rounded_grid", disable_numparse=True))
+        if self.present:
+            print(f"{self.present} file(s) already downloaded.")
+        if self.unsized:
+            print(f"{self.unsized} file(s) have no listed or reported size and are not counted.")
+        if trimmed:
+            print(f"Left out to stay within budget ({len(trimmed)}): " +
+                  ", ".join(f"{landing_filename(c[0].link)} ({human_bytes(c[1])})" for c in trimmed))
+
+    def over(self, costs):
+        """
+        The budgets costs exceed, by name; empty if it fits.
+        """
+        download, disk = self.totals(costs)
+        over = []
+        if self.args.max_bytes is not None and download > self.args.max_bytes:
+            over.append("--max-bytes")
+        if disk > free_space(self.root) - (self.args.reserve_free or 0):
+            over.append("free disk space")
+        return over
+
+    def trim(self):
+        """
+        Keep jobs in their scheduled order while they fit, passing over
+        the ones that don't; returns (kept, left out).
+        """
+        kept, trimmed = [], []
+        for cost in self.costs:
+            if not self.over(kept + [cost]):
+                kept.append(cost)
+            else:
+                trimmed.append(cost)
+        return kept, trimmed
+
+    def settle(self):
+        """
+        Print the plan and return the jobs to download: all of them if
+        they fit, what fits with --trim (or when the user agrees), none
+        with --dry-run. Exits when the plan doesn't fit.
+        """
+        costs, trimmed = self.costs, []
+        over = " and ".join(self.over(costs))
+        if over and not self.args.trim:
+            self.report(costs)
+            if self.args.dry_run:
+                print(f"The plan exceeds {over}; --trim downloads only what fits.")
+                return []
+            if not (sys.stdin.isatty() and
+                    input(f"\nThe plan exceeds {over}. Download only what fits? [Y/n] ")
+                    .lower() in ("", "y")):
+                sys.exit(f"Not downloading: the plan exceeds {over} "
+                         "(--trim downloads only what fits).")
+        if over:
+            costs, trimmed = self.trim()
+        self.report(costs, trimmed)
+        return [] if self.args.dry_run else [c[0] for c in costs]
+
+def job_cost(job, sess, force=False):
+    """
+    (bytes to download, bytes it adds on disk, archive bytes on disk until
+    unpacked) for job, (None, ...) when its size isn't listed, or None if
+    it is already there. Partial downloads and replaced files are deducted;
+    a chart in the store costs no download, only the space of copying it
+    in with --link-mode copy. A new download takes its own size on disk
+    in every mode: copy mode keeps no second copy in the store.
+    """
+    final = os.path.join(job.folder, landing_filename(job.link))
+    manifest, store = getattr(sess, "manifest", None), getattr(sess, "store", None)
+    is_zip = final.lower().endswith(".zip")
+    if not force:
+        if (os.path.exists(final) and not is_zip) or (manifest and manifest.complete(final)):
+            return None
+        row = store.stored(job) if store else None
+        if row:
+            copied = sum(f[2] for f in json.loads(row["files"]))
+            return 0, copied if store.modes[0] == "copy" else 0, 0
+    size = size_bytes(job.size)
+    if size is None:
+        return None, None, None
+    if is_zip and os.path.exists(final):
+        # downloaded, but not fully extracted yet
+        return 0, int(size * ZIP_EXPANSION), 0
+    tmp = final + ".tmp"
+    done, _ = read_partial(tmp)
+    # preallocated partials already hold their space
+    held = os.stat(tmp).st_blocks * 512 if os.path.exists(tmp) else 0
+    replaced = 0
+    row = manifest.get(final) if force and manifest else None
+    if row:
+        replaced = sum(os.path.getsize(f) for f in manifest.files(row) if os.path.exists(f))
+    if not is_zip:
+        return size - done, max(0, size - held - replaced), 0
+    # mirrors send the extracted files, and --stream-zip never stores the archive
+    unpacked = getattr(sess, "stream_zip", False) or getattr(sess, "mirror", None)
+    return (size - done, max(0, int(size * ZIP_EXPANSION) - replaced),
+            0 if unpacked else max(0, size - held))
+
+def head_size(job, sess):
+    """
+    The length of job's download as its server reports it, for files the
+    catalog lists without a size; None if it can't be had.
+    """
+    try:
+        url = resolve_link(job.source, job.link, sess)
+        with host_slot(url, sess):
+            r = sess.head(url, allow_redirects=True, timeout=60)
+        r.raise_for_status()
+    except Exception as e:
+        # the download itself will report a link that can't be resolved
+        log(f"⚠ could not size {landing_filename(job.link)}: {e}")
+        return None
+    length = r.headers.get("content-length", "")
+    return int(length) if length.isdigit() else None
+
+def free_space(path):
+    """
+    Free bytes on the filesystem that path is (or will be) created on.
+    """
+    while not os.path.exists(path):
+        path = os.path.dirname(path)
+    return shutil.disk_usage(path).free
+
+def human_duration(seconds):
+    seconds = int(seconds)
+    if seconds < 60:
+        return f"{seconds}s"
+    if seconds < 3600:
+        return f"{seconds // 60}m {seconds % 60:02d}s"
+    return f"{seconds // 3600}h {seconds % 3600 // 60:02d}m"
+
+# ───── streaming zip ─────
+class StreamUnsupported(Exception):
+    """The archive cannot be decoded front to back; use the central directory."""
+
+def member_path(dest, name):
+    """
+    Map an archive member name to a path under dest, dropping drive letters,
+    absolute prefixes and '..' components the same way zipfile does.
+    """
+    parts = [p for p in name.replace("\\", "/").split("/") if p not in ("", ".", "..")]
+    parts = [re.sub(r'^[A-Za-z]:', '', p) for p in parts]
+    return os.path.join(dest, *parts) if parts else None
+
+class ZipStreamExtractor:
+    """
+    Extract a ZIP archive from its local file headers while it downloads.
+    Members are written to '<name>.part' and renamed once their CRC checks
+    out, so only complete files ever carry their final name. Raises
+    StreamUnsupported for entries that can only be read via the central
+    directory (encryption, stored data with a trailing descriptor, ...).
+    """
+    LOCAL, CENTRAL, DESCRIPTOR = 0x04034b50, 0x02014b50, 0x08074b50
+    ENDS = (0x02014b50, 0x06054b50, 0x06064b50)
+
+    def __init__(self, dest):
+        self.dest = dest
+        self.buf = bytearray()
+        self.state = "header"
+        self.member = None
+        self.names = []      # extracted file paths, in archive order
+        self.digests = {}    # extracted path -> SHA-256, hashed as written
+        self.central = []    # member names listed by the central directory
+
+    # -- input --
+    def feed(self, data):
+        self.buf += data
+        while self.step():
+            pass
+
+    def close(self):
+        """
+        Finish after the last byte: every central-directory entry must have
+        been seen as a local entry, otherwise the local headers lied.
+        """
+        if self.state != "central":
+            raise zipfile.BadZipFile("archive ended before the central directory")
+        self.step()
+        seen = {os.path.normpath(p) for p in self.names}
+        for name in self.central:
+            path = member_path(self.dest, name)
+            if path and not name.endswith("/") and os.path.normpath(path) not in seen:
+                raise StreamUnsupported(f"member '{name}' has no local header")
+
+    def abort(self):
+        m = self.member
+        if m and m.get("fp"):
+            m["fp"].close()
+            os.remove(m["part"])
+        self.member = None
+
+    # -- parsing --
+    def step(self):
+        if self.state == "header":
+            return self.read_header()
+        if self.state == "data":
+            return self.read_data()
+        if self.state == "descriptor":
+            return self.read_descriptor()
+        if self.state == "central":
+            return self.read_central()
+        return False
+
+    def read_header(self):
+        if len(self.buf) < 4:
+            return False
+        sig, = struct.unpack_from("<I", self.buf)
+        if sig in self.ENDS:
+            self.state = "central"
+            return True
+        if sig != self.LOCAL:
+            raise StreamUnsupported(f"unexpected signature {sig:#010x}")
+        if len(self.buf) < 30:
+            return False
+        (_, _, flags, method, _, _, crc, csize, usize,
+         nlen, xlen) = struct.unpack_from("<IHHHHHIIIHH", self.buf)
+        if len(self.buf) < 30 + nlen + xlen:
+            return False
+        raw = bytes(self.buf[30:30 + nlen])
+        name = raw.decode("utf-8" if flags & 0x800 else "cp437")
+        extra = bytes(self.buf[30 + nlen:30 + nlen + xlen])
+        del self.buf[:30 + nlen + xlen]
+        zip64 = False
+        pos = 0
+        while pos + 4 <= len(extra):
+            tag, size = struct.unpack_from("<HH", extra, pos)
+            if tag == 0x0001:
+                zip64 = True
+                vals = list(struct.unpack_from(f"<{size // 8}Q", extra, pos + 4))
+                if usize == 0xFFFFFFFF and vals:
+                    usize = vals.pop(0)
+                if csize == 0xFFFFFFFF and vals:
+                    csize = vals.pop(0)
+            pos += 4 + size
+        if flags & 0x1:
+            raise StreamUnsupported(f"'{name}' is encrypted")
+        descriptor = bool(flags & 0x8)
+        if method == 0:
+            if descriptor:
+                raise StreamUnsupported(f"'{name}' is stored with a trailing descriptor")
+            dec = None
+        elif method == 8:
+            dec = zlib.decompressobj(-zlib.MAX_WBITS)
+        elif method == 9:
+            try:
+                from zipfile_deflate64.deflate64 import Deflate64
+            except ImportError:
+                raise StreamUnsupported(f"'{name}' needs zipfile-deflate64")
+            if descriptor:
+                raise StreamUnsupported(f"'{name}' is deflate64 with a trailing descriptor")
+            dec = Deflate64()
+        else:
+            raise StreamUnsupported(f"'{name}' uses compression method {method}")
+        path = member_path(self.dest, name)
+        m = {"name": name, "path": path, "method": method, "dec": dec, "crc": crc, "usize": usize,
+             "left": None if descriptor else csize, "zip64": zip64,
+             "out_crc": 0, "out_size": 0, "sha": hashlib.sha256(), "fp": None}
+        if path and not name.endswith("/"):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            m["part"] = path + ".part"
+            m["fp"] = open(m["part"], "wb")
+        elif path:
+            os.makedirs(path, exist_ok=True)
+        self.member = m
+        self.state = "data"
+        return True
+
+    def write(self, data):
+        m = self.member
+        if data and m["fp"]:
+            m["fp"].write(data)
+            m["sha"].update(data)
+        m["out_crc"] = zlib.crc32(data, m["out_crc"])
+        m["out_size"] += len(data)
+
+    def read_data(self):
+        m = self.member
+        if not self.buf:
+            return False
+        if m["left"] is not None:
+            take = min(m["left"], len(self.buf))
+            chunk = bytes(self.buf[:take])
+            del self.buf[:take]
+            m["left"] -= take
+        else:
+            chunk = bytes(self.buf)
+            self.buf.clear()
+        dec = m["dec"]
+        if dec is None:
+            self.write(chunk)
+        elif m["method"] == 8:
+            # cap each inflate call so a run of zeros cannot balloon memory
+            self.write(dec.decompress(chunk, 1 << 22))
+            while dec.unconsumed_tail and not dec.eof:
+                self.write(dec.decompress(dec.unconsumed_tail, 1 << 22))
+            if dec.eof and m["left"] is None:
+                self.buf[:0] = dec.unused_data
+                self.state = "descriptor"
+                return True
+        else:
+            self.write(dec.decompress(chunk))
+        if m["left"] == 0:
+            self.finish(m["crc"], m["usize"])
+        return True
+
+    def read_descriptor(self):
+        m = self.member
+        size = 24 if m["zip64"] else 16
+        if len(self.buf) < size:
+            return False
+        sig, = struct.unpack_from("<I", self.buf)
+        off = 4 if sig == self.DESCRIPTOR else 0
+        if len(self.buf) < size - 4 + off:
+            return False
+        if m["zip64"]:
+            crc, _, usize = struct.unpack_from("<IQQ", self.buf, off)
+        else:
+            crc, _, usize = struct.unpack_from("<III", self.buf, off)
+        del self.buf[:size - 4 + off]
+        self.finish(crc, usize)
+        return True
+
+    def finish(self, crc, usize):
+        m = self.member
+        if m["dec"] is not None and not m["dec"].eof:
+            raise zipfile.BadZipFile(f"'{m['name']}': compressed data ends early")
+        if m["out_crc"] != crc or m["out_size"] != usize:
+            self.abort()
+            raise zipfile.BadZipFile(f"'{m['name']}': CRC or size mismatch")
+        if m["fp"]:
+            m["fp"].close()
+            os.replace(m["part"], m["path"])
+            self.names.append(m["path"])
+            self.digests[m["path"]] = m["sha"].hexdigest()
+        self.member = None
+        self.state = "header"
+
+    def read_central(self):
+        # only the member names are needed, for the completeness check
+        while len(self.buf) >= 46:
+            sig, = struct.unpack_from("<I", self.buf)
+            if sig != self.CENTRAL:
+                self.buf.clear()
+                return False
+            nlen, xlen, clen = struct.unpack_from("<HHH", self.buf, 28)
+            if len(self.buf) < 46 + nlen + xlen + clen:
+                return False
+            flags, = struct.unpack_from("<H", self.buf, 8)
+            raw = bytes(self.buf[46:46 + nlen])
+            self.central.append(raw.decode("utf-8" if flags & 0x800 else "cp437"))
+            del self.buf[:46 + nlen + xlen + clen]
+        return False
+
+def fetch_zip_streaming(url, dest, sess, bar):
+    """
+    Download a ZIP and extract it on the fly, without the archive ever
+    touching the disk. Broken connections resume with a Range request at the
+    byte the extractor has consumed; a server that ignores ranges is simply
+    read past that point again.
+    """
+    throttle = getattr(sess, "throttle", None)
+    ex = ZipStreamExtractor(dest)
+    digest = hashlib.sha256()
+    fed = 0
+    validator = None
+    try:
+        for attempt in range(RESUME_ATTEMPTS + 1):
+            headers = {}
+            if fed:
+                headers["Range"] = f"bytes={fed}-"
+                if validator:
+                    headers["If-Range"] = validator
+            try:
+                with sess.get(url, stream=True, timeout=60, headers=headers) as r:
+                    r.raise_for_status()
+                    skip = fed if r.status_code != 206 else 0
+                    if skip and validator and validator not in (r.headers.get("ETag"), r.headers.get("Last-Modified")):
+                        raise zipfile.BadZipFile("archive changed on the server mid-download")
+                    if not fed:
+                        etag = r.headers.get("ETag", "")
+                        modified = r.headers.get("Last-Modified", "")
+                        validator = etag if etag and not etag.startswith("W/") else modified
+                        bar.reset(int(r.headers.get("content-length", 0)))
+                    for chunk in r.iter_content(1 << 20):
+                        if throttle:
+                            throttle.consume(len(chunk))
+                        if skip:
+                            drop = min(skip, len(chunk))
+                            chunk, skip = chunk[drop:], skip - drop
+                        if chunk:
+                            ex.feed(chunk)
+                            digest.update(chunk)
+                            fed += len(chunk)
+                            bar.update(len(chunk))
+                if ex.state != "central":
+                    raise requests.exceptions.ChunkedEncodingError(f"stream ended after {fed:,} bytes")
+                ex.close()
+                return {"url": url, "bytes": fed, "etag": etag, "last_modified": modified,
+                        "sha256": digest.hexdigest(), "files": ex.names, "digests": ex.digests}
+            except (requests.exceptions.ChunkedEncodingError,
+                    requests.exceptions.ConnectionError,
+                    requests.exceptions.Timeout):
+                if attempt == RESUME_ATTEMPTS:
+                    raise
+                time.sleep(min(2 ** attempt, 30))
+    except BaseException:
+        ex.abort()
+        raise
+
+# ───── zip extraction ─────
+def extract_member(z, name, out):
+    """
+    Inflate member name of the open archive z to out via 'out.part',
+    hashing it as it is written, and return (out, SHA-256).
+    """
+    digest = hashlib.sha256()
+    part = out + ".part"
+    try:
+        # the CRC is checked at the end of the member, before the rename
+        with z.open(name) as src, open(part, "wb") as fp:
+            for chunk in iter(lambda: src.read(EXTRACT_CHUNK), b""):
+                digest.update(chunk)
+                fp.write(chunk)
+        # replacing the name never writes through a store hardlink or symlink
+        os.replace(part, out)
+    except BaseException:
+        if os.path.exists(part):
+            os.remove(part)
+        raise
+    return out, digest.hexdigest()
+
+def extract_batch(archive, members):
+    """
+    Inflate [(name, out), ...] of archive in an extraction worker and return
+    [(out, SHA-256), ...]. The archive is opened once per batch and closed
+    before returning, so no idle worker keeps a deleted archive allocated.
+    """
+    with open_zip(archive) as z:
+        return [extract_member(z, name, out) for name, out in members]
+
+class ExtractPool:
+    """
+    Worker processes shared by every download for inflating ZIP members,
+    started on first use. The pool is sized by --extract-jobs, and
+    --extract-memory caps it at EXTRACT_WORKER_MEM per worker.
+    """
+    def __init__(self, workers, memory=None):
+        if memory:
+            workers = min(workers, memory // EXTRACT_WORKER_MEM)
+        self.workers = max(1, workers)
+        self.ex = None
+        self.lock = threading.Lock()
+
+    def submit(self, *args):
+        with self.lock:
+            if self.ex is None:
+                self.ex = process_pool(self.workers)
+        return self.ex.submit(extract_batch, *args)
+
+    def close(self):
+        with self.lock:
+            if self.ex is not None:
+                self.ex.shutdown()
+                self.ex = None
+
+def extract_zip(archive, dest, sess, progress, state, position=None):
+    """
+    Extract archive into dest, largest members first. Each finished member
+    is added to progress["members"] (name -> SHA-256) and saved to state,
+    so an interrupted run only inflates the members left.
+    Returns {path: SHA-256} for every file of the archive.
+    """
+    members = progress.setdefault("members", {})
+    pool = getattr(sess, "extractor", None)
+    with open_zip(archive) as z:
+        # a name listed twice is extracted once, from its last entry
+        paths = {}
+        for m in z.infolist():
+            path = member_path(dest, m.filename)
+            if path and m.is_dir():
+                os.makedirs(path, exist_ok=True)
+            elif path:
+                paths[path] = m
+        todo = sorted(((p, m) for p, m in paths.items() if m.filename not in members),
+                      key=lambda pm: -pm[1].file_size)
+        for path, _ in todo:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        bar = tqdm.tqdm(total=sum(m.file_size for _, m in todo), unit="B", unit_scale=True,
+                        desc=("⇲ " + os.path.basename(archive))[:24],
+                        position=position, leave=position is None)
+
+        def finished(m, digest):
+            members[m.filename] = digest
+            write_json(state, progress)
+            bar.set_postfix_str(os.path.basename(m.filename)[-24:])
+            bar.update(m.file_size)
+
+        try:
+            if (pool is None or pool.workers == 1 or len(todo) < 2
+                    or bar.total < EXTRACT_PARALLEL_MIN):
+                # not worth starting processes for
+                for path, m in todo:
+                    finished(m, extract_member(z, m.filename, path)[1])
+            else:
+                # about four batches per worker keep the workers evenly loaded
+                # (the largest members go out alone) while each batch reads
+                # the central directory only once
+                target = bar.total / (pool.workers * 4)
+                batches, size = [[]], 0
+                for path, m in todo:
+                    if batches[-1] and size >= target:
+                        batches.append([])
+                        size = 0
+                    batches[-1].append((path, m))
+                    size += m.file_size
+                futs = {pool.submit(archive, [(m.filename, path) for path, m in batch]): batch
+                        for batch in batches}
+                try:
+                    for fut in as_completed(futs):
+                        for (_, m), (_, digest) in zip(futs[fut], fut.result()):
+                            finished(m, digest)
+                except BaseException:
+                    for fut in futs:
+                        fut.cancel()
+                    raise
+        finally:
+            bar.close()
+    return {path: members[m.filename] for path, m in paths.items()}
+
+def unpack_zip(archive, dest, info, sess, position=None):
+    """
+    Extract a downloaded archive and delete it; return info with the
+    extracted files and their digests. Until then '<archive>.extract' holds
+    info and the finished members, and a later run resumes from it.
+    """
+    state = archive + ".extract"
+    progress = read_json(state) or {"info": info}
+    write_json(state, progress)
+    with phase(sess, "extract", file=os.path.basename(archive),
+               resumed=len(progress.get("members", {}))) as stats:
+        digests = extract_zip(archive, dest, sess, progress, state, position)
+        stats.update(files=len(digests),
+                     written=sum(os.path.getsize(f) for f in digests))
+    os.remove(archive)
+    os.remove(state)
+    return dict(progress["info"], files=list(digests), digests=digests)
+
+# ───── fetch ─────
+_done_lock = threading.Lock()   # guards `done` and folder creation across workers
+
+def read_partial(tmp):
+    """
+    Return (bytes already on disk, stored validators) for a partial download.
+    A .tmp without its .meta sidecar cannot be trusted and counts as empty.
+    """
+    meta = read_json(tmp + ".meta")
+    if meta is None or not os.path.exists(tmp):
+        return 0, {}
+    # a preallocated file is full-size from the start; "done" says how far it got
+    size = os.path.getsize(tmp)
+    return min(meta.get("done", size), size), meta
+
+def sha256_file(path, limit=None):
+    """
+    SHA-256 object over the first `limit` bytes of path (all by default).
+    """
+    digest = hashlib.sha256()
+    left = os.path.getsize(path) if limit is None else limit
+    with open(path, "rb") as fp:
+        while left > 0:
+            chunk = fp.read(min(left, 1 << 20))
+            if not chunk:
+                break
+            digest.update(chunk)
+            left -= len(chunk)
+    return digest
+
+def discard_partial(tmp):
+    for p in (tmp, tmp + ".meta"):
+        if os.path.exists(p):
+            os.remove(p)
+
+def open_ranged(url, sess, tmp):
+    """
+    Open a streaming GET for url, resuming the partial file tmp when the
+    server honours Range and the stored ETag/Last-Modified still matches.
+    Returns (response or None if already complete, start offset, total size).
+    """
+    offset, meta = read_partial(tmp)
+    etag = meta.get("etag") or ""
+    # If-Range needs a strong validator; weak ETags fall back to the date
+    validator = etag if etag and not etag.startswith("W/") else meta.get("last_modified")
+    headers = {}
+    if offset and (validator or meta.get("total")):
+        headers["Range"] = f"bytes={offset}-"
+        if validator:
+            headers["If-Range"] = validator
+    r = sess.get(url, stream=True, timeout=60, headers=headers)
+    if r.status_code == 416 and offset:
+        r.close()
+        if meta.get("total") == offset:
+            return None, offset, offset
+        discard_partial(tmp)
+        return open_ranged(url, sess, tmp)
+    r.raise_for_status()
+    length = int(r.headers.get("content-length", 0))
+    if r.status_code == 206:
+        m = re.match(r"bytes (\d+)-\d+/(\d+|\*)", r.headers.get("Content-Range", ""))
+        total = int(m.group(2)) if m and m.group(2) != "*" else offset + length
+        if not m or int(m.group(1)) != offset or meta.get("total", total) != total:
+            # server answered a different range, or the file changed size
+            r.close()
+            discard_partial(tmp)
+            return open_ranged(url, sess, tmp)
+    else:
+        # 200: ranges unsupported or validator mismatch – start over
+        offset, total = 0, length
+    write_json(tmp + ".meta", {
+        "url": url,
+        "etag": r.headers.get("ETag", etag if offset else ""),
+        "last_modified": r.headers.get("Last-Modified", meta.get("last_modified", "") if offset else ""),
+        "total": total,
+        "done": offset,
+    })
+    return r, offset, total
+
+class WriteBehind:
+    """
+    Writes one download from a background thread, so the socket reader
+    never waits on slow storage. The reader takes a buffer from a small
+    ring, fills it in place and submit()s it; the writer thread hashes
+    and writes it at the next offset, then returns it to the ring. The
+    file is preallocated to its full size, and the .meta sidecar's "done"
+    is checkpointed (after an fsync with sync_every) so a resume starts
+    from bytes that actually reached the disk.
+    """
+    def __init__(self, path, offset, total, digest, sync_every=None):
+        self.meta_path = path + ".meta"
+        self.fp = open(path, "r+b" if offset else "wb")
+        if total > offset:
+            try:
+                os.posix_fallocate(self.fp.fileno(), offset, total - offset)
+            except (AttributeError, OSError):
+                self.fp.truncate(total)   # sparse, but claims the size
+        self.fp.seek(offset)
+        self.pos = self.checkpoint = offset
+        self.digest, self.sync_every = digest, sync_every
+        self.free, self.full = Queue(), Queue()
+        for _ in range(WRITE_RING):
+            self.free.put(bytearray(0))
+        self.error = None
+        self.write_s = self.stall_s = 0.0
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def buffer(self, size):
+        """
+        A free buffer of at least size bytes (waits while all are in flight).
+        """
+        t0 = time.perf_counter()
+        buf = self.free.get()
+        self.stall_s += time.perf_counter() - t0
+        if self.error:
+            raise self.error
+        return buf if len(buf) >= size else bytearray(size)
+
+    def submit(self, buf, n):
+        self.full.put((buf, n))
+
+    def run(self):
+        every = self.sync_every or 8 << 20
+        while True:
+            item = self.full.get()
+            if item is None:
+                break
+            buf, n = item
+            try:
+                if not self.error:
+                    view = memoryview(buf)[:n]
+                    t0 = time.perf_counter()
+                    self.fp.write(view)
+                    self.write_s += time.perf_counter() - t0
+                    self.digest.update(view)
+                    view.release()
+                    self.pos += n
+                    if self.pos - self.checkpoint >= every:
+                        self.save()
+            except Exception as e:
+                self.error = e
+            self.free.put(buf)
+
+    def save(self):
+        self.fp.flush()
+        if self.sync_every:
+            os.fsync(self.fp.fileno())
+        meta = read_json(self.meta_path, {})
+        meta["done"] = self.pos
+        write_json(self.meta_path, meta)
+        self.checkpoint = self.pos
+
+    def close(self):
+        """
+        Drain the queue, record how far the file got and close it; raises
+        the writer's error, if any. Returns the bytes now on disk.
+        """
+        self.full.put(None)
+        self.thread.join()
+        try:
+            if not self.error:
+                self.save()
+        finally:
+            self.fp.close()
+        if self.error:
+            raise self.error
+        return self.pos
+
+def body_reader(r):
+    """
+    readinto() for a streamed response body: straight from the socket into
+    the caller's buffer when the body is sent as is, through urllib3's
+    decoder otherwise.
+    """
+    fp = getattr(r.raw, "_fp", None)
+    if (fp is not None and hasattr(fp, "readinto")
+            and r.headers.get("Content-Encoding", "identity").lower() == "identity"):
+        return fp.readinto
+
+    def readinto(view):
+        data = r.raw.read(len(view), decode_content=True)
+        view[:len(data)] = data
+        return len(data)
+    return readinto
+
+def stream_into(r, writer, throttle, bar, stats):
+    """
+    Copy r's body into writer's ring buffers, growing or shrinking the read
+    size so each read takes about CHUNK_TARGET seconds at the throughput
+    seen end to end (socket, rate cap and waits for a free buffer).
+    """
+    readinto = body_reader(r)
+    chunk = CHUNK_MIN
+    # a rate cap settles up after each read; small reads keep it smooth
+    ceiling = min(CHUNK_MAX, max(CHUNK_MIN, int(throttle.rate * CHUNK_TARGET))) if throttle else CHUNK_MAX
+    last = time.perf_counter()
+    while True:
+        buf = writer.buffer(chunk)
+        view = memoryview(buf)[:chunk]
+        try:
+            n = readinto(view)
+        except socket.timeout as e:
+            raise requests.exceptions.Timeout(e)
+        except (OSError, http.client.HTTPException) as e:
+            # the socket is read directly, so map its errors like urllib3 would
+            raise requests.exceptions.ChunkedEncodingError(e)
+        finally:
+            view.release()
+        if not n:
+            writer.free.put(buf)
+            break
+        if throttle:
+            throttle.consume(n)
+        writer.submit(buf, n)
+        bar.update(n)
+        stats["bytes"] += n
+        now = time.perf_counter()
+        took, last = now - last, now
+        if n == chunk and took > 0:
+            rate = n / took
+            chunk = min(ceiling, max(CHUNK_MIN, 1 << int(rate * CHUNK_TARGET).bit_length() - 1))
+    stats["chunk"] = chunk
+
+class SegmentsUnsupported(Exception):
+    """The server stopped honouring byte ranges mid-way through a segmented fetch."""
+
+def fetch_segmented(url, sess, tmp, meta, segments, bar):
+    """
+    Download url as `segments` parallel byte ranges written straight into
+    their offsets of a preallocated tmp file. Progress per range is kept in
+    the .meta sidecar, so each range resumes (and retries) on its own.
+    Returns the number of bytes received.
+    """
+    total = meta["total"]
+    if not meta.get("parts"):
+        step = -(-total // segments)
+        meta["parts"] = [[lo, min(lo + step, total) - 1, 0] for lo in range(0, total, step)]
+        with open(tmp, "wb") as fp:
+            fp.truncate(total)
+        write_json(tmp + ".meta", meta)
+    etag = meta.get("etag") or ""
+    validator = etag if etag and not etag.startswith("W/") else meta.get("last_modified")
+    throttle = getattr(sess, "throttle", None)
+    lock = threading.Lock()
+    stop = threading.Event()   # set when one range fails for good
+    bar.reset(total)
+    before = sum(p[2] for p in meta["parts"])
+    bar.update(before)
+
+    def run(part):
+        with phase(sess, "segment", url=url, range=f"{part[0]}-{part[1]}",
+                   resumed_from=part[2]) as m:
+            fetch_range(part, m)
+
+    def fetch_range(part, m):
+        for attempt in range(RESUME_ATTEMPTS + 1):
+            m["attempts"] = attempt + 1
+            start, end = part[0] + part[2], part[1]
+            if start > end:
+                return
+            headers = {"Range": f"bytes={start}-{end}"}
+            if validator:
+                headers["If-Range"] = validator
+            try:
+                with host_slot(url, sess), \
+                        sess.get(url, stream=True, timeout=60, headers=headers) as r:
+                    m.setdefault("ttfb", r.elapsed.total_seconds())
+                    r.raise_for_status()
+                    if r.status_code != 206:
+                        raise SegmentsUnsupported(f"HTTP {r.status_code} for range {start}-{end}")
+                    with open(tmp, "r+b") as fp:
+                        fp.seek(start)
+                        for chunk in r.iter_content(1 << 20):
+                            if stop.is_set():
+                                return
+                            chunk = chunk[:end + 1 - part[0] - part[2]]
+                            if throttle:
+                                throttle.consume(len(chunk))
+                            fp.write(chunk)
+                            fp.flush()   # only count bytes that reached the file
+                            with lock:
+                                part[2] += len(chunk)
+                                bar.update(len(chunk))
+                            m["bytes"] = part[2] - m["resumed_from"]
+                if part[0] + part[2] <= end:
+                    raise requests.exceptions.ChunkedEncodingError(f"range {start}-{end} cut short")
+                return
+            except (requests.exceptions.ChunkedEncodingError,
+                    requests.exceptions.ConnectionError,
+                    requests.exceptions.Timeout):
+                if attempt == RESUME_ATTEMPTS:
+                    stop.set()
+                    raise
+                time.sleep(min(2 ** attempt, 30))
+            except Exception:
+                stop.set()
+                raise
+            finally:
+                with lock:
+                    write_json(tmp + ".meta", meta)
+
+    with ThreadPoolExecutor(max_workers=len(meta["parts"])) as ex:
+        for fut in [ex.submit(run, part) for part in meta["parts"]]:
+            fut.result()
+    return sum(p[2] for p in meta["parts"]) - before
+
+def fetch(url,dest,sess,done,position=None,fname=None):
+    fname = fname or os.path.basename(urlparse(url).path)
+    # skip if already downloaded (or being downloaded by another worker)
+    with _done_lock:
+        if (dest, fname) in done:
+            return
+        done.add((dest, fname))
+    try:
+        return _fetch(url, dest, fname, sess, position)
+    except BaseException:
+        # let a retry (or a later pick of the same file) claim it again
+        with _done_lock:
+            done.discard((dest, fname))
+        raise
+
+def _fetch(url, dest, fname, sess, position):
+    """
+    Download url into dest; return {url, bytes, etag, last_modified, sha256,
+    files} describing what was transferred and which files it produced.
+    """
+    final = os.path.join(dest, fname)
+    # an archive left behind was downloaded but not fully extracted
+    if final.lower().endswith(".zip") and os.path.exists(final):
+        log(f"↻ {fname}: resuming extraction")
+        info = {"url": url, "bytes": os.path.getsize(final), "etag": "", "last_modified": "",
+                "sha256": sha256_file(final).hexdigest()}
+        return unpack_zip(final, dest, info, sess, position)
+    # indicate which file and URL we're downloading
+    log(f"⇣ {fname}  URL: {url}")
+    throttle = getattr(sess, "throttle", None)
+    segments = getattr(sess, "segments", 1)
+    digest = None   # hashed inline on single-stream transfers
+    # download into temporary file, resuming it if a previous run left one
+    tmp = final + ".tmp"
+    bar = tqdm.tqdm(unit="B", unit_scale=True, desc=fname[:24],
+                    position=position, leave=position is None)
+    # zips can be unpacked while they download, unless a partial is waiting
+    with phase(sess, "fetch", file=fname, url=url) as m:
+        if (getattr(sess, "stream_zip", False) and final.lower().endswith(".zip")
+                and not os.path.exists(tmp)):
+            try:
+                with host_slot(url, sess):
+                    info = fetch_zip_streaming(url, dest, sess, bar)
+                bar.close()
+                m.update(mode="stream-zip", bytes=info["bytes"], files=len(info["files"]),
+                         written=sum(os.path.getsize(f) for f in info["files"]))
+                return info
+            except StreamUnsupported as e:
+                log(f"⚠ {fname}: {e}; extracting via the central directory instead")
+        m.update(mode="single", bytes=0, write_s=0.0)
+        # only lost connections use up attempts; the loop is left by break or raise
+        attempt = 0
+        while True:
+            m["attempts"] = attempt + 1
+            try:
+                with host_slot(url, sess):
+                    offset, meta = read_partial(tmp)
+                    segmented = bool(meta.get("parts"))
+                    if not segmented:
+                        r, offset, total = open_ranged(url, sess, tmp)
+                        if r is None:
+                            digest = None
+                            break
+                        m.setdefault("ttfb", r.elapsed.total_seconds())
+                        segmented = (segments > 1 and not offset and total >= SEGMENT_MIN_SIZE
+                                     and r.headers.get("Accept-Ranges", "").lower() == "bytes")
+                        if segmented:
+                            r.close()
+                            meta = read_json(tmp + ".meta")
+                        else:
+                            with r:
+                                if offset and attempt == 0:
+                                    log(f"↻ {fname}: resuming at {offset:,} bytes")
+                                    m["resumed_from"] = offset
+                                bar.reset(total)
+                                bar.update(offset)
+                                # a resumed file re-reads its prefix once; fresh ones don't
+                                digest = sha256_file(tmp, offset) if offset else hashlib.sha256()
+                                writer = WriteBehind(tmp, offset, total, digest,
+                                                     getattr(sess, "fsync_every", None))
+                                try:
+                                    stream_into(r, writer, throttle, bar, m)
+                                finally:
+                                    written = writer.close()
+                                    m["write_s"] += writer.write_s
+                                    m["stall_s"] = m.get("stall_s", 0.0) + writer.stall_s
+                if segmented:
+                    # outside the slot above: every range takes a host slot of its own
+                    m["mode"] = "segmented"
+                    m["bytes"] += fetch_segmented(url, sess, tmp, meta, segments, bar)
+                    digest = None
+                    break
+                if total and written < total:
+                    raise requests.exceptions.ChunkedEncodingError(
+                        f"stream ended at {written:,} of {total:,} bytes")
+                break
+            except SegmentsUnsupported as e:
+                # the file changed or ranges went away: start over on one stream
+                # right away (with no parts left, this can't happen twice)
+                log(f"⚠ {fname}: {e}; falling back to a single connection")
+                discard_partial(tmp)
+                segments = 1
+            except (requests.exceptions.ChunkedEncodingError,
+                    requests.exceptions.ConnectionError,
+                    requests.exceptions.Timeout) as e:
+                # keep the partial file; the next attempt asks for the rest
+                if attempt == RESUME_ATTEMPTS:
+                    raise
+                log(f"↻ {fname}: connection lost ({type(e).__name__}), resuming")
+                time.sleep(min(2 ** attempt, 30))
+                attempt += 1
         bar.close()
     # move to final filename
     try:
         os.replace(tmp, final)
     except Exception:
         os.rename(tmp, final)
+    meta = read_json(tmp + ".meta", {})
+    if os.path.exists(tmp + ".meta"):
+        os.remove(tmp + ".meta")
+    # segmented or already-complete transfers are hashed in one read pass
+    if not digest:
+        with phase(sess, "hash", file=fname, bytes=os.path.getsize(final)):
+            digest = sha256_file(final)
+    info = {"url": url, "bytes": os.path.getsize(final), "etag": meta.get("etag", ""),
+            "last_modified": meta.get("last_modified", ""), "sha256": digest.hexdigest(),
+            "files": [final], "digests": {final: digest.hexdigest()}}
     # if zip, extract and remove
     if final.lower().endswith(".zip"):
-        with zipfile.ZipFile(final) as z:
-            z.extractall(dest)
-        os.remove(final)
+        info = unpack_zip(final, dest, info, sess, position)
+    return info
+
+# one picked catalog row and the folder it lands in
+Job = namedtuple("Job", "source region area link size note folder")
+
+def download_one(job, sess, done, position=None, force=False):
+    """
+    Resolve and fetch one picked file into its area folder, and record it
+    in the manifest. Returns fetch()'s info dict, or None if nothing was
+    downloaded. Safe to run from several worker threads at once.
+    """
+    folder, link = job.folder, job.link
+    with _done_lock:
+        os.makedirs(folder, exist_ok=True)
+    # determine expected filenames
+    basename = landing_filename(link)
+    final_path = os.path.join(folder, basename)
+    manifest = getattr(sess, "manifest", None)
+    # skip if already downloaded (a leftover .tmp is resumed by fetch, and
+    # a leftover .zip was not fully extracted); extracted zips are only
+    # known to the manifest
+    present = os.path.exists(final_path) and not final_path.lower().endswith(".zip")
+    if not force and (present or (manifest and manifest.complete(final_path))):
+        log(f"⇢ Skipping {basename}: already present")
+        with _done_lock:
+            done.add((folder, basename))
+        return
+    store = getattr(sess, "store", None)
+    # resolve direct-download URL and fetch
+    # fetch differently depending on source
+    try:
+        # a chart already fetched for another area/region/source is linked in
+        with store.key_lock(job) if store else threading.Lock():
+            info = store.materialize(job, sess, fresh_only=force) if store else None
+            if info:
+                log(f"⇄ {basename}: linked from the store")
+                with _done_lock:
+                    done.add((folder, basename))
+            else:
+                info = fetch_job(job, sess, done, position)
+                if info and store:
+                    store.adopt(job, info)
+        if info and manifest:
+            manifest.record(job, final_path, info)
+        return info
+    except Exception as e:
+        log(f"⚠ {basename} {e}")
+
+def fetch_job(job, sess, done, position=None):
+    """
+    Resolve job.link if needed and fetch it into job.folder.
+    """
+    folder, link = job.folder, job.link
+    if getattr(sess, "mirror", None):
+        info = fetch_from_mirror(job, sess, done, position)
+        if info:
+            return info
+    if SOURCES[job.source].resolve is None:
+        # direct HTTP download
+        return fetch(link, folder, sess, done, position)
+    # link resolution (usually answered from a link cache)
+    direct_url = resolve_link(job.source, link, sess)
+    try:
+        return fetch(direct_url, folder, sess, done, position)
+    except requests.HTTPError as e:
+        if e.response is None or e.response.status_code not in (403, 404, 410):
+            raise
+        # a cached link went stale before its expiry: resolve afresh
+        return fetch(resolve_link(job.source, link, sess, fresh=True), folder, sess, done,
+                     position)
+
+def download_all(jobs, sess, done, workers=1, force=False):
+    """
+    Run download_one() for every job on a pool of worker threads and return
+    the info dicts of the files actually downloaded. Each worker draws a
+    fixed tqdm line so the bars stack instead of tearing.
+    """
+    workers = max(1, min(workers, len(jobs) or 1))
+    if not getattr(sess, "mirror", None):
+        # resolve links up front so downloads start immediately; charts the
+        # store can place are never fetched, and a link picked twice is
+        # fetched once
+        store = getattr(sess, "store", None)
+        fetched = [j for j in jobs if force or not (store and store.stored(j))]
+        for source in dict.fromkeys(j.source for j in fetched):
+            if SOURCES[source].resolve_all:
+                links = dict.fromkeys(j.link for j in fetched if j.source == source)
+                SOURCES[source].resolve_all(list(links), sess)
+    if workers == 1:
+        infos = [download_one(job, sess, done, force=force) for job in jobs]
+        return [i for i in infos if i]
+    slots = Queue()
+    for pos in range(1, workers + 1):
+        slots.put(pos)
+
+    def work(job):
+        pos = slots.get()
+        try:
+            return download_one(job, sess, done, pos, force)
+        finally:
+            slots.put(pos)
+
+    infos = []
+    overall = tqdm.tqdm(total=len(jobs), unit="file", desc="Total", position=0)
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        for fut in as_completed([ex.submit(work, job) for job in jobs]):
+            if fut.result():
+                infos.append(fut.result())
+            overall.update(1)
+    overall.close()
+    return infos
+
+# ───── manifest ─────
+class Manifest:
+    """
+    SQLite record of every chart fetched into a charts directory: where it
+    came from, the validators it was served with and the files it produced.
+    Kept inside the charts directory so it travels with the charts.
+    """
+    FILE = ".chartbutler.db"
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS charts (
+            path          TEXT PRIMARY KEY,  -- landing file, relative to the charts dir
+            source        TEXT NOT NULL,
+            region        TEXT,
+            area          TEXT,
+            page_url      TEXT NOT NULL,     -- catalog link
+            url           TEXT,              -- URL the bytes actually came from
+            size          TEXT,              -- size as listed in the catalog
+            note          TEXT,
+            bytes         INTEGER,           -- bytes transferred
+            etag          TEXT,
+            last_modified TEXT,
+            files         TEXT,              -- JSON list of produced files
+            fetched       REAL,
+            sha256        TEXT               -- digest of the bytes transferred
+        )
+    """
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self.db = sqlite3.connect(os.path.join(root, self.FILE), check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        self.lock = threading.Lock()
+        with self.lock, self.db:
+            self.db.executescript(self.SCHEMA)
+            cols = {r[1] for r in self.db.execute("PRAGMA table_info(charts)")}
+            if "sha256" not in cols:
+                self.db.execute("ALTER TABLE charts ADD COLUMN sha256 TEXT")
+
+    def rel(self, path):
+        return os.path.relpath(path, self.root)
+
+    def get(self, path):
+        with self.lock:
+            return self.db.execute("SELECT * FROM charts WHERE path = ?", (self.rel(path),)).fetchone()
+
+    def files(self, row):
+        return [os.path.join(self.root, f) for f in json.loads(row["files"] or "[]")]
+
+    def complete(self, path):
+        """
+        True if path was recorded and every file it produced is still there.
+        """
+        row = self.get(path)
+        return bool(row) and all(os.path.exists(f) for f in self.files(row))
+
+    def record(self, job, path, info):
+        """
+        Store a finished download. Files the previous version produced but
+        this one did not (a re-packed zip, say) are deleted.
+        """
+        old = self.get(path)
+        new = {self.rel(f) for f in info["files"]}
+        if old:
+            folder = os.path.dirname(path)
+            for f in json.loads(old["files"] or "[]"):
+                stale = os.path.join(self.root, f)
+                if f in new or not os.path.lexists(stale):
+                    continue
+                os.remove(stale)
+                # drop subfolders of the area folder the old pack left empty
+                parent = os.path.dirname(stale)
+                while parent != folder and parent.startswith(folder) and not os.listdir(parent):
+                    os.rmdir(parent)
+                    parent = os.path.dirname(parent)
+        with self.lock, self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO charts (path, source, region, area, page_url, url, size,"
+                " note, bytes, etag, last_modified, files, fetched, sha256)"
+                " VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?)",
+                (self.rel(path), job.source, job.region, job.area, job.link, info["url"],
+                 job.size, job.note, info["bytes"], info["etag"], info["last_modified"],
+                 json.dumps(sorted(new)), time.time(), info.get("sha256")))
+
+    def rows(self):
+        with self.lock:
+            return self.db.execute("SELECT * FROM charts ORDER BY source, path").fetchall()
+
+    def by_link(self, link):
+        """
+        The latest complete download of a catalog link, or None.
+        """
+        with self.lock:
+            rows = self.db.execute("SELECT * FROM charts WHERE page_url = ? ORDER BY fetched DESC",
+                                   (link,)).fetchall()
+        return next((row for row in rows
+                     if all(os.path.exists(f) for f in self.files(row))), None)
+
+# ───── store ─────
+FICLONE = 0x40049409   # Linux ioctl: share extents between two files (reflink)
+
+def reflink(src, dst):
+    import fcntl
+    with open(src, "rb") as fs, open(dst, "wb") as fd:
+        try:
+            fcntl.ioctl(fd.fileno(), FICLONE, fs.fileno())
+        except OSError:
+            fd.close()
+            os.remove(dst)
+            raise
+
+LINKERS = {
+    "hardlink": os.link,
+    "reflink": reflink,
+    "symlink": lambda src, dst: os.symlink(os.path.relpath(src, os.path.dirname(dst)), dst),
+    "copy": shutil.copyfile,
+}
+
+class Store:
+    """
+    Content-addressed store under <charts-dir>/.store. Every unique file is
+    kept once as .store/<sha[:2]>/<sha>; area folders get links to it.
+    Downloads are also indexed by catalog link + listed size, so a chart
+    listed under several areas, regions or sources is fetched only once;
+    a key from an earlier run is HEAD-checked before it is reused.
+    """
+    DIR = ".store"
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS store_keys (
+            key           TEXT PRIMARY KEY,  -- catalog link | listed size
+            url           TEXT,
+            bytes         INTEGER,
+            etag          TEXT,
+            last_modified TEXT,
+            sha256        TEXT,
+            files         TEXT               -- JSON [[name in folder, sha256, size(, first copy)], ...]
+        )
+    """
+
+    def __init__(self, manifest, mode="hardlink"):
+        self.manifest = manifest
+        self.root = os.path.join(manifest.root, self.DIR)
+        # the preferred mode first, then the rest as fallbacks
+        modes = list(LINKERS)
+        self.modes = [mode] + [m for m in modes[modes.index(mode) + 1:]]
+        self.lock = threading.Lock()
+        self.key_locks = {}
+        self.saved_net = 0    # bytes not downloaded thanks to a key hit
+        self.saved_disk = 0   # bytes not stored twice thanks to a content hit
+        self.fresh = set()    # keys adopted during this run
+        with manifest.lock, manifest.db:
+            manifest.db.executescript(self.SCHEMA)
+
+    @staticmethod
+    def key(job):
+        return f"{job.link}|{job.size}"
+
+    def key_lock(self, job):
+        """
+        Lock held while a key is being downloaded, so a second pick of the
+        same chart waits for the first and then materializes it.
+        """
+        with self.lock:
+            return self.key_locks.setdefault(self.key(job), threading.Lock())
+
+    def blob(self, sha):
+        return os.path.join(self.root, sha[:2], sha)
+
+    def place(self, blob, path):
+        """
+        Make path a copy of blob using the first link mode that works here.
+        """
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if os.path.lexists(path):
+            os.remove(path)
+        for mode in self.modes:
+            try:
+                LINKERS[mode](blob, path)
+                return mode
+            except OSError:
+                continue
+        raise OSError(f"cannot materialize {path}")
+
+    def materialize(self, job, sess, fresh_only=False):
+        """
+        Populate job.folder from the store if this chart was fetched before
+        (with fresh_only, only if it was fetched during this run).
+        Returns an info dict like fetch()'s, or None on a miss.
+        """
+        if fresh_only and self.key(job) not in self.fresh:
+            return None
+        row = self.stored(job)
+        if not row or not self.current(job, row, sess):
+            return None
+        out, digests = [], {}
+        for entry in json.loads(row["files"]):
+            name, sha = entry[0], entry[1]
+            path = os.path.join(job.folder, name)
+            src = self.source(entry)
+            if src != self.blob(sha):
+                # a copy in an area folder may have been edited since
+                if sha256_file(src).hexdigest() != sha:
+                    log(f"⚠ {src} differs from the chart it was downloaded as; downloading again")
+                    return None
+                if self.modes[0] != "copy":
+                    # a link needs the blob after all
+                    os.makedirs(os.path.dirname(self.blob(sha)), exist_ok=True)
+                    with self.lock:
+                        try:
+                            os.link(src, self.blob(sha))
+                        except OSError:
+                            shutil.copyfile(src, self.blob(sha))
+                    src = self.blob(sha)
+            if os.path.abspath(src) != os.path.abspath(path):
+                self.place(src, path)
+            out.append(path)
+            digests[path] = sha
+        with self.lock:
+            self.saved_net += row["bytes"] or 0
+        return {"url": row["url"], "bytes": row["bytes"], "etag": row["etag"],
+                "last_modified": row["last_modified"], "sha256": row["sha256"],
+                "files": out, "digests": digests}
+
+    def stored(self, job):
+        """
+        The store_keys row of job if all its files can be placed, else None.
+        """
+        with self.manifest.lock:
+            row = self.manifest.db.execute("SELECT * FROM store_keys WHERE key = ?",
+                                           (self.key(job),)).fetchone()
+        if row and all(self.source(f) for f in json.loads(row["files"])):
+            return row
+        return None
+
+    def source(self, entry):
+        """
+        Where a files entry is placed from: its blob, or without one (copy
+        mode stores none) the first copy placed, if it is still that size.
+        """
+        blob = self.blob(entry[1])
+        if os.path.exists(blob):
+            return blob
+        if len(entry) > 3:
+            first = os.path.join(self.manifest.root, entry[3])
+            if os.path.isfile(first) and os.path.getsize(first) == entry[2]:
+                return first
+        return None
+
+    def current(self, job, row, sess):
+        """
+        HEAD-check a key stored by an earlier run against the validators and
+        length recorded when it was downloaded; the catalog's listed size
+        alone misses a chart replaced by one of the same size. A changed
+        chart's key is dropped so it is downloaded again.
+        """
+        if self.key(job) in self.fresh:
+            return True
+        recorded = {"source": job.source, "page_url": job.link, "etag": row["etag"],
+                    "last_modified": row["last_modified"], "bytes": row["bytes"]}
+        try:
+            why = head_changed(recorded, sess)
+        except requests.RequestException as e:
+            log(f"⚠ {landing_filename(job.link)}: using the stored copy unchecked ({e})")
+            return True
+        if not why:
+            return True
+        log(f"↻ {landing_filename(job.link)}: {why} since it was stored; downloading again")
+        with self.manifest.lock, self.manifest.db:
+            self.manifest.db.execute("DELETE FROM store_keys WHERE key = ?", (self.key(job),))
+        return False
+
+    def adopt(self, job, info):
+        """
+        Move freshly downloaded files into the store (or, if identical
+        content is already there, swap them for a link to it) and index the
+        download under its key. In copy mode every placement is a full copy
+        anyway, so the downloaded files stay where they are and later
+        placements are copied from them; no blob is kept.
+        """
+        files = []
+        for path in info["files"]:
+            sha = info["digests"].get(path) or sha256_file(path).hexdigest()
+            size = os.path.getsize(path)
+            if self.modes[0] == "copy":
+                files.append([os.path.relpath(path, job.folder), sha, size,
+                              os.path.relpath(path, self.manifest.root)])
+                continue
+            blob = self.blob(sha)
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            with self.lock:
+                if os.path.exists(blob):
+                    self.saved_disk += size
+                    self.place(blob, path)
+                elif self.modes[0] == "hardlink":
+                    try:
+                        os.link(path, blob)
+                    except OSError:
+                        # no hardlinks here: the store keeps the bytes, the folder a link
+                        os.replace(path, blob)
+                        self.place(blob, path)
+                else:
+                    # the folder gets the chosen kind of link, not the blob's inode
+                    os.replace(path, blob)
+                    self.place(blob, path)
+            files.append([os.path.relpath(path, job.folder), sha, size])
+        with self.manifest.lock, self.manifest.db:
+            self.manifest.db.execute(
+                "INSERT OR REPLACE INTO store_keys VALUES (?,?,?,?,?,?,?)",
+                (self.key(job), info["url"], info["bytes"], info["etag"],
+                 info["last_modified"], info.get("sha256"), json.dumps(files)))
+        with self.lock:
+            self.fresh.add(self.key(job))
+
+    def prune(self):
+        """
+        Drop the keys of charts the manifest no longer lists, and blobs no
+        remaining key refers to. References are counted from the manifest,
+        not from link counts, which miss symlinked, reflinked and copied
+        areas (and runs may use different --link-modes).
+        """
+        db = self.manifest.db
+        with self.manifest.lock:
+            listed = {f"{r['page_url']}|{r['size']}"
+                      for r in db.execute("SELECT page_url, size FROM charts")}
+            keys = db.execute("SELECT key, files FROM store_keys").fetchall()
+        used, dead = set(), []
+        for row in keys:
+            if row["key"] in listed:
+                used.update(f[1] for f in json.loads(row["files"]))
+            else:
+                dead.append((row["key"],))
+        if dead:
+            with self.manifest.lock, db:
+                db.executemany("DELETE FROM store_keys WHERE key = ?", dead)
+        freed = 0
+        for dirpath, _, filenames in os.walk(self.root):
+            for f in filenames:
+                if f not in used:
+                    p = os.path.join(dirpath, f)
+                    freed += os.path.getsize(p)
+                    os.remove(p)
+        return freed
+
+    def report(self):
+        if self.saved_net or self.saved_disk:
+            print(f"Store: {human_bytes(self.saved_net)} not downloaded, "
+                  f"{human_bytes(self.saved_disk)} of duplicate content linked instead of stored.")
+
+def human_bytes(n):
+    for unit in ("B", "KB", "MB", "GB"):
+        if n < 1024 or unit == "GB":
+            return f"{n:.1f} {unit}" if unit != "B" else f"{n} B"
+        n /= 1024
+
+def head_changed(row, sess):
+    """
+    HEAD the chart's download URL; return a reason string if the server's
+    validators or length differ from what was recorded, else None.
+    """
+    url = resolve_link(row["source"], row["page_url"], sess)
+    with host_slot(url, sess):
+        r = sess.head(url, allow_redirects=True, timeout=60)
+    r.raise_for_status()
+    etag, modified = r.headers.get("ETag"), r.headers.get("Last-Modified")
+    length = r.headers.get("content-length")
+    if etag and row["etag"] and etag != row["etag"]:
+        return "ETag changed"
+    if modified and row["last_modified"] and modified != row["last_modified"]:
+        return f"modified {modified}"
+    if length and row["bytes"] and int(length) != row["bytes"]:
+        return f"size {row['bytes']:,} → {int(length):,} bytes"
+    return None
+
+def sync(args, sess):
+    """
+    Check every chart in the manifest against its source and re-fetch the
+    ones that changed. Catalog differences (gone, new size) are found by
+    diffing the catalog; everything else is HEAD-checked.
+    """
+    root = os.path.abspath(args.charts_dir)
+    manifest = sess.manifest
+    rows = manifest.rows()
+    if not rows:
+        print(f"Nothing tracked in '{root}' yet – download some charts first.")
+        return
+    if not args.offline:
+        args.cache_ttl = 0   # always revalidate the catalog pages
+    changed, removed, to_head = [], [], []
+    trees = load_catalogs(sorted({row["source"] for row in rows}), sess, args)
+    for source, tree in trees.items():
+        listed = {link: (region, area, size, note)
+                  for region, files in tree.items() for area, link, size, note in files}
+        for row in (r for r in rows if r["source"] == source):
+            cur = listed.get(row["page_url"])
+            if cur is None:
+                removed.append(row)
+            elif cur[2] != row["size"]:
+                changed.append((row, cur, f"catalog size {row['size']} → {cur[2]}"))
+            else:
+                to_head.append((row, cur))
+    if not args.offline:
+        with ThreadPoolExecutor(max_workers=max(4, args.jobs)) as ex:
+            futs = {ex.submit(head_changed, row, sess): (row, cur) for row, cur in to_head}
+            for fut in as_completed(futs):
+                row, cur = futs[fut]
+                try:
+                    why = fut.result()
+                except Exception as e:
+                    log(f"⚠ could not check {row['path']}: {e}")
+                    continue
+                if why:
+                    changed.append((row, cur, why))
+    report = [("changed", row["path"], why) for row, _, why in changed]
+    report += [("removed upstream", row["path"], row["page_url"]) for row in removed]
+    if report:
+        print(tabulate(report, headers=["Status", "Chart", "Detail"], tablefmt="rounded_grid"))
+    print(f"{len(rows) - len(changed) - len(removed)} unchanged, "
+          f"{len(changed)} changed, {len(removed)} removed upstream.")
+    if not changed or args.dry_run:
+        return
+    jobs = [Job(row["source"], cur[0], cur[1], row["page_url"], cur[2], cur[3],
+                os.path.dirname(os.path.join(root, row["path"])))
+            for row, cur, _ in changed]
+    plan = Plan(jobs, sess, args, force=True)
+    jobs = plan.settle()
+    done = set()
+    started = time.perf_counter()
+    infos = download_all(jobs, sess, done, args.jobs, force=True)
+    plan.record(sess, time.perf_counter() - started)
+    print(f"\nSynced {len(jobs)} chart(s) in '{root}'.")
+    if sess.store:
+        freed = sess.store.prune()
+        if freed:
+            print(f"Store: pruned {human_bytes(freed)} of superseded chart files.")
+    if not args.no_verify:
+        verify_all(mbtiles_of(infos), args.verify_jobs, sess=sess)
+
+# ───── mirror ─────
+def mirror_get(sess, path, **params):
+    """
+    GET path from the --mirror-url mirror. Returns None if the mirror can't
+    be reached; it is then left out for the rest of the run.
+    """
+    mirror = getattr(sess, "mirror", None)
+    if not mirror:
+        return None
+    try:
+        return sess.get(mirror + path, params=params, timeout=MIRROR_TIMEOUT)
+    except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+        log(f"⚠ mirror {mirror} unreachable ({type(e).__name__}); using the sources directly")
+        sess.mirror = None
+    except requests.RequestException as e:
+        log(f"⚠ mirror {mirror}: {e}")
+    return None
+
+def fetch_from_mirror(job, sess, done, position=None):
+    """
+    Fetch the files of job from the mirror, as the mirror extracted them.
+    A chart the mirror lacks is fetched upstream by the mirror while this
+    waits. Returns fetch()-style info, or None to fall back upstream.
+    """
+    name = landing_filename(job.link)
+    # another worker may drop an unreachable mirror from sess at any time
+    mirror = getattr(sess, "mirror", None)
+    if not mirror:
+        return None
+    waiting = False
+    while True:
+        r = mirror_get(sess, "chart", source=job.source, link=job.link)
+        if r is None or r.status_code not in (200, 202):
+            if r is not None:
+                log(f"⚠ {name}: not on the mirror ({r.status_code}); using the source")
+            return None
+        if r.status_code == 200:
+            break
+        if not waiting:
+            log(f"⧗ {name}: the mirror is fetching it upstream")
+            waiting = True
+        time.sleep(MIRROR_POLL)
+    chart = r.json()
+    info = {"url": chart["url"], "bytes": 0, "etag": chart["etag"],
+            "last_modified": chart["last_modified"], "sha256": chart["sha256"],
+            "files": [], "digests": {}}
+    for f in chart["files"]:
+        path = os.path.join(job.folder, *f["name"].split("/"))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        got = fetch(mirror + "charts/" + quote(f["path"]), os.path.dirname(path),
+                    sess, done, position, fname=os.path.basename(path))
+        if got:
+            info["bytes"] += got["bytes"]
+            info["files"] += got["files"]
+            info["digests"].update(got["digests"])
+    return info
+
+class Mirror:
+    """
+    The `serve` side: a charts directory shared with other chartbutler
+    clients over HTTP. It serves
+      /catalog/<source>      the catalog tree, scraped once for all clients
+      /resolve?source=&link= the download URL of a link, from the mirror's cache
+      /chart?source=&link=   the files of a chart (202 while it is fetched)
+      /charts/<path>         those files, with Range support
+    A chart the mirror lacks is fetched upstream once, however many clients
+    ask for it at the same time.
+    """
+    def __init__(self, args, sess):
+        self.args = args
+        self.sess = sess
+        self.root = os.path.abspath(args.charts_dir)
+        self.lock = threading.Lock()
+        self.pending = {}    # catalog link -> Future of its upstream download
+        self.catalog_locks = {source: threading.Lock() for source in SOURCES}
+        self.pool = ThreadPoolExecutor(max_workers=max(1, args.jobs))
+
+    def handle(self, req, head=False):
+        url = urlparse(req.path)
+        path = unquote(url.path)
+        q = {k: v[0] for k, v in parse_qs(url.query).items()}
+        try:
+            if path.startswith("/charts/"):
+                return self.send_file(req, path[len("/charts/"):], head)
+            if path.startswith("/catalog/") and path[len("/catalog/"):] in SOURCES:
+                source = path[len("/catalog/"):]
+                # concurrent clients wait for one scrape instead of each starting one
+                with self.catalog_locks[source]:
+                    tree = load_catalog(source, self.sess, self.args)
+                return self.send_json(req, 200, {"tree": tree}, head)
+            if path == "/resolve" and q.get("source") in SOURCES and q.get("link"):
+                return self.resolve(req, q["source"], q["link"], head)
+            if path == "/chart" and q.get("source") in SOURCES and q.get("link"):
+                return self.chart(req, q["source"], q["link"], head)
+            req.send_error(404)
+        except Exception as e:
+            log(f"⚠ {req.path}: {e}")
+            req.send_error(502, str(e))
+
+    def send_json(self, req, status, data, head=False):
+        body = json.dumps(data).encode()
+        req.send_response(status)
+        req.send_header("Content-Type", "application/json")
+        req.send_header("Content-Length", str(len(body)))
+        req.end_headers()
+        if not head:
+            req.wfile.write(body)
+
+    def chart(self, req, source, link, head):
+        row = self.sess.manifest.by_link(link)
+        if row:
+            folder = os.path.dirname(row["path"])
+            files = [os.path.relpath(f, self.root) for f in self.sess.manifest.files(row)]
+            return self.send_json(req, 200, {
+                "url": row["url"], "etag": row["etag"], "last_modified": row["last_modified"],
+                "sha256": row["sha256"],
+                "files": [{"path": f.replace(os.sep, "/"),
+                           "name": os.path.relpath(f, folder).replace(os.sep, "/")}
+                          for f in files]}, head)
+        with self.lock:
+            fut = self.pending.get(link)
+            if fut and fut.done():
+                # finished, yet not in the manifest: the upstream download failed
+                del self.pending[link]
+                return req.send_error(502, "upstream download failed")
+        if fut is None:
+            # a catalog load only holds up requests for that source
+            job = self.job(source, link)
+            if job is None:
+                return req.send_error(404, "not in the catalog")
+            with self.lock:
+                if link not in self.pending:
+                    log(f"⇣ {landing_filename(link)}: fetching upstream for a client")
+                    self.pending[link] = self.pool.submit(download_one, job, self.sess, set())
+        return self.send_json(req, 202, {"pending": True}, head)
+
+    def resolve(self, req, source, link, head):
+        # only links of the mirror's own catalogs, so it is no open proxy
+        resolve = SOURCES[source].resolve
+        if resolve is None or self.job(source, link) is None:
+            return req.send_error(404, "not in the catalog")
+        return self.send_json(req, 200, {"url": resolve(link, self.sess)}, head)
+
+    def job(self, source, link):
+        """
+        Job for link, if the mirror's own catalog lists it: clients can
+        only have the mirror fetch charts of the catalogs it serves.
+        """
+        with self.catalog_locks[source]:
+            tree = load_catalog(source, self.sess, self.args)
+        for region, rows in tree.items():
+            for row in rows:
+                if row[1] == link:
+                    return job_for(self.root, source, region, row)
+        return None
+
+    def send_file(self, req, rel, head):
+        from email.utils import formatdate
+        parts = [p for p in rel.split("/") if p]
+        # no '..', and nothing under .store or the manifest
+        if not parts or any(p.startswith(".") for p in parts):
+            return req.send_error(404)
+        path = os.path.join(self.root, *parts)
+        if not os.path.isfile(path):
+            return req.send_error(404)
+        with open(path, "rb") as fp:
+            st = os.fstat(fp.fileno())
+            size = st.st_size
+            etag = f'"{st.st_size:x}-{st.st_mtime_ns:x}"'
+            modified = formatdate(st.st_mtime, usegmt=True)
+            start, end, status = 0, size - 1, 200
+            rng = req.headers.get("Range", "")
+            if_range = req.headers.get("If-Range")
+            m = re.match(r"bytes=(\d*)-(\d*)$", rng.strip())
+            if m and any(m.groups()) and (not if_range or if_range in (etag, modified)):
+                if m.group(1):
+                    start = int(m.group(1))
+                    end = min(int(m.group(2)), size - 1) if m.group(2) else size - 1
+                else:
+                    start = max(0, size - int(m.group(2)))
+                if start >= size or start > end:
+                    req.send_response(416)
+                    req.send_header("Content-Range", f"bytes */{size}")
+                    req.send_header("Content-Length", "0")
+                    req.end_headers()
+                    return
+                status = 206
+            req.send_response(status)
+            req.send_header("Content-Type", "application/octet-stream")
+            req.send_header("Content-Length", str(end - start + 1))
+            req.send_header("Accept-Ranges", "bytes")
+            req.send_header("ETag", etag)
+            req.send_header("Last-Modified", modified)
+            if status == 206:
+                req.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+            req.end_headers()
+            if not head and end >= start:
+                req.connection.sendfile(fp, start, end - start + 1)
+
+def serve(args, sess):
+    """
+    Share --charts-dir with other chartbutler clients (see Mirror) until
+    interrupted.
+    """
+    # http.server is only needed here
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    mirror = Mirror(args, sess)
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            mirror.handle(self)
+
+        def do_HEAD(self):
+            mirror.handle(self, head=True)
+
+        def log_message(self, fmt, *a):
+            log(f"⇄ {self.client_address[0]} {fmt % a}")
+
+    server = ThreadingHTTPServer((args.bind, args.port), Handler)
+    print(f"Serving '{mirror.root}' on http://{args.bind}:{args.port}/ (Ctrl-C to stop)")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        mirror.pool.shutdown(wait=False)
+
+# ───── verify ─────
+def verify_mbtiles(path, sha256=None):
+    """
+    Integrity-check one .mbtiles file; runs in a worker process.
+    Checks SQLite's quick_check, the MBTiles metadata/tiles schema and
+    counts tiles per zoom level, which must cover every level from the
+    metadata's minzoom to its maxzoom (or between the lowest and highest
+    level present); with sha256 also re-hashes the file.
+    Returns (path, [problems], {zoom: tiles}).
+    """
+    problems, zooms = [], {}
+    if sha256 and sha256_file(path).hexdigest() != sha256:
+        problems.append("SHA-256 differs from the downloaded file")
+    try:
+        db = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            res = [r[0] for r in db.execute("PRAGMA quick_check")]
+            if res != ["ok"]:
+                problems.append("quick_check: " + "; ".join(res[:3]))
+            names = {r[0] for r in db.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'view')")}
+            for table, cols in (("metadata", {"name", "value"}),
+                                ("tiles", {"zoom_level", "tile_column", "tile_row", "tile_data"})):
+                if table not in names:
+                    problems.append(f"no '{table}' table")
+                    continue
+                have = {r[1] for r in db.execute(f"PRAGMA table_info({table})")}
+                if not cols <= have:
+                    problems.append(f"'{table}' lacks {', '.join(sorted(cols - have))}")
+            if "tiles" in names and not problems:
+                zooms = dict(db.execute("SELECT zoom_level, COUNT(*) FROM tiles GROUP BY zoom_level"))
+                if not zooms:
+                    problems.append("no tiles")
+                else:
+                    meta = dict(db.execute("SELECT name, value FROM metadata "
+                                           "WHERE name IN ('minzoom', 'maxzoom')"))
+                    try:
+                        lo, hi = int(meta["minzoom"]), int(meta["maxzoom"])
+                    except (KeyError, TypeError, ValueError):
+                        lo, hi = min(zooms), max(zooms)
+                    gaps = [z for z in range(lo, hi + 1) if z not in zooms]
+                    if gaps:
+                        problems.append(f"no tiles at zoom {', '.join(map(str, gaps))} "
+                                        f"(of {lo}-{hi})")
+        finally:
+            db.close()
+    except sqlite3.DatabaseError as e:
+        problems.append(f"not a readable SQLite file: {e}")
+    return path, problems, zooms
+
+def mbtiles_of(infos):
+    return [f for info in infos for f in info["files"] if f.lower().endswith(".mbtiles")]
+
+def verify_all(paths, workers, expected=None, sess=None):
+    """
+    Verify paths across a process pool and print the outcome.
+    expected maps path -> SHA-256 for files whose digest is known.
+    Returns the list of (path, problems) that failed.
+    """
+    if not paths:
+        return []
+    expected = expected or {}
+    failed, levels = [], {}   # zoom -> [files, tiles]
+    bar = tqdm.tqdm(total=len(paths), unit="file", desc="Verifying")
+    with phase(sess, "verify", files=len(paths),
+               bytes=sum(os.path.getsize(p) for p in paths)) as m, \
+            process_pool(max(1, min(workers, len(paths)))) as ex:
+        futs = [ex.submit(verify_mbtiles, p, expected.get(p)) for p in paths]
+        for fut in as_completed(futs):
+            path, problems, zooms = fut.result()
+            for z, n in zooms.items():
+                level = levels.setdefault(z, [0, 0])
+                level[0] += 1
+                level[1] += n
+            if problems:
+                failed.append((path, problems))
+            bar.update(1)
+        tiles = sum(n for _, n in levels.values())
+        m.update(failed=len(failed), tiles=tiles)
+    bar.close()
+    if levels:
+        print(tabulate([(z, f, f"{n:,}") for z, (f, n) in sorted(levels.items())],
+                       headers=["Zoom", "Files", "Tiles"], tablefmt="rounded_grid"))
+    if failed:
+        print(tabulate([(p, "\n".join(pr)) for p, pr in sorted(failed)],
+                       headers=["File", "Problem"], tablefmt="rounded_grid"))
+    print(f"✓ {len(paths) - len(failed)} of {len(paths)} .mbtiles file(s) OK, {tiles:,} tiles checked.")
+    return failed
+
+def verify(args, sess):
+    """
+    Re-check every .mbtiles under --charts-dir without downloading anything.
+    Files downloaded as-is are also compared with their recorded SHA-256.
+    """
+    root = os.path.abspath(args.charts_dir)
+    paths = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+        paths += [os.path.join(dirpath, f) for f in filenames if f.lower().endswith(".mbtiles")]
+    expected = {}
+    for row in sess.manifest.rows():
+        files = sess.manifest.files(row)
+        if row["sha256"] and files == [os.path.join(root, row["path"])]:
+            expected[files[0]] = row["sha256"]
+    if not paths:
+        print(f"No .mbtiles files under '{root}'.")
+        return
+    if verify_all(sorted(paths), args.verify_jobs, expected, sess):
+        sys.exit(1)
+
+# ───── list ─────
+def list_catalog(args):
+    """
+    Print the regions of each cached catalog, or with --region the files
+    of those regions numbered as the file picker and --select number them.
+    Cached trees are used whatever their age and without importing the
+    HTML stack; a source never cached (or --refresh) is fetched once.
+    """
+    if args.region and not args.source:
+        sys.exit("--source is required with --region (or --source all)")
+    sources = source_names(args.source)
+    entries = {} if args.refresh else {src: read_json(catalog_path(src, args)) for src in sources}
+    missing = [src for src in sources if not entries.get(src)]
+    fetched = load_catalogs(missing, make_session(args), args) if missing else {}
+    trees, ages = {}, {}
+    for source in sources:
+        entry = entries.get(source)
+        if entry:
+            trees[source] = catalog_tree(entry)
+            ages[source] = f"cached {(time.time() - entry['fetched']) / 3600:.1f} h ago"
+        else:
+            trees[source], ages[source] = fetched[source], "just fetched"
+    if args.source == "all":
+        # a region only has to be in one of the sources
+        for name in args.region or []:
+            match_region(name, list(merge_regions(trees)))
+    for source, tree in trees.items():
+        print(f"\n{source.upper()}  ({ages[source]})")
+        if not args.region:
+            rows = []
+            for i, (region, files) in enumerate(tree.items(), 1):
+                total = sum(size_bytes(f[2]) or 0 for f in files)
+                rows.append((i, region, len(files), human_bytes(total) if total else ""))
+            print(tabulate(rows, headers=["#", "Region", "Files", "Size"], tablefmt="rounded_grid"))
+            continue
+        for name in args.region:
+            region = match_region(name, list(tree), args.source != "all")
+            if region is None:
+                continue
+            print(region)
+            print(tabulate([(i, sz, landing_filename(link), area, note)
+                            for i, (area, link, sz, note) in enumerate(tree[region], 1)],
+                           headers=["#", "Size", "Filename", "Area", "Notes"],
+                           tablefmt="rounded_grid"))
 
 # ───── main ─────
 def main():
     # parse CLI and select source if needed
     args = cli()
-    if args.source is None:
-        args.source = pick_source()
-    # create HTTP session
+    if args.command == "list":
+        return list_catalog(args)
+    if args.profile is None:
+        return run(args)
+    return run_profiled(lambda: run(args), args.profile or None)
+
+def run(args):
+    """
+    Run the chosen command, then print the per-phase metrics.
+    """
+    # create HTTP session; the manifest remembers what landed where
     sess = make_session(args)
-    # select scraping function based on source
-    if args.source == 'savinggrace':
-        tree = scrape_savinggrace(sess)
-    else:
-        tree = scrape(sess)
-    # prepare output directory, grouping by source
+    sess.manifest = Manifest(os.path.abspath(args.charts_dir))
+    sess.store = None if args.no_store else Store(sess.manifest, args.link_mode)
+    try:
+        if args.command == "sync":
+            sync(args, sess)
+        elif args.command == "verify":
+            verify(args, sess)
+        elif args.command == "serve":
+            serve(args, sess)
+        else:
+            download(args, sess)
+        sess.metrics.summary()
+    finally:
+        sess.extractor.close()
+        sess.metrics.close()
+
+def download(args, sess):
+    """
+    Pick charts (interactively, from flags or from a plan) and download them.
+    """
     root = os.path.abspath(args.charts_dir)
-    source_dir = 'ChartLocker' if args.source == 'chartlocker' else 'SavingGrace'
-    base_dir = os.path.join(root, source_dir)
+    if args.command == "search":
+        jobs = search_jobs(args, sess, root)
+        if not jobs:
+            return
+        base_dir = root
+    elif args.plan or args.mirror or args.all_regions or args.region:
+        # unattended: everything comes from the flags or the plan file
+        jobs = plan_jobs(args, sess, root)
+        base_dir = root
+    else:
+        source = args.source or pick_source()
+        sources = list(SOURCES) if source == "all" else [source]
+        # load the catalogs (cached between runs); same-named regions are merged
+        regions = merge_regions(load_catalogs(sources, sess, args))
+        # prepare output directory, grouping by source
+        base_dir = root if source == "all" else os.path.join(root, SOURCES[source].folder)
+        # select region and files
+        region = pick_region(list(regions))
+        files = [row for _, row in regions[region]]
+        picks = parse_selection(args.select, len(files)) if args.select else pick_links(files)
+        jobs = [job_for(root, regions[region][i][0], region, files[i]) for i in picks]
+    jobs = order_jobs(jobs, args.order or "catalog")
+    # size the picks up against the budgets before anything is transferred
+    plan = Plan(jobs, sess, args)
+    jobs = plan.settle()
+    if args.dry_run:
+        return
     os.makedirs(base_dir, exist_ok=True)
-    # select region and files
-    region = pick_region(list(tree))
-    files=tree[region]
-    picks=pick_links(files)
     done=set()
-    for i in picks:
-        area, link, _, _ = files[i]
-        # construct folder under base_dir/region_mbtiles/area_slug
-        region_dir = f"{region.replace(' ','_')}_mbtiles"
-        folder = os.path.join(base_dir, region_dir, slugify(area))
-        os.makedirs(folder, exist_ok=True)
-        # determine expected filenames
-        basename = landing_filename(link)
-        final_path = os.path.join(folder, basename)
-        tmp_path = final_path + ".tmp"
-        # skip if already downloaded
-        if os.path.exists(final_path):
-            print(f"⇢ Skipping {basename}: already present")
-            done.add((folder, basename))
-            continue
-        # remove any stale temp file to allow fresh download
-        if os.path.exists(tmp_path):
-            os.remove(tmp_path)
-        # resolve direct-download URL and fetch
-        # fetch differently depending on source
-        try:
-            if args.source == 'savinggrace':
-                # direct HTTP download
-                fetch(link, folder, sess, done)
-            else:
-                # MediaFire URL resolution
-                direct_url = mediafire_direct(link, sess)
-                fetch(direct_url, folder, sess, done)
-        except Exception as e:
-            print("⚠", basename, e)
+    started = time.perf_counter()
+    infos = download_all(jobs, sess, done, args.jobs)
+    plan.record(sess, time.perf_counter() - started)
     print(f"\nFinished – {len(done)} file(s) downloaded into '{base_dir}'.")
+    if sess.store:
+        sess.store.report()
+    if not args.no_verify:
+        verify_all(mbtiles_of(infos), args.verify_jobs, sess=sess)
 
 if __name__=="__main__":
     try: main()
     except KeyboardInterrupt: sys.exit("\nCancelled")
-
@@ -0,0 +1,134 @@
+"""
+ZipStreamExtractor against zipfile: every archive is extracted both ways
+and the two trees must match byte for byte.
+"""
+import io
+import os
+import zipfile
+
+import pytest
+import requests
+
+import chartbutler as cb
+
+MEMBERS = {
+    "readme.txt": b"chart catalogue\n" * 50,
+    "ENC_ROOT/US5WA22M/US5WA22M.000": os.urandom(200_000),
+    "ENC_ROOT/US5WA22M/notes.txt": b"\x00" * 300_000,
+    "empty.txt": b"",
+}
+
+class Unseekable(io.RawIOBase):
+    """A write-only sink, which makes zipfile emit data descriptors."""
+    def __init__(self):
+        self.data = bytearray()
+    def writable(self):
+        return True
+    def write(self, b):
+        self.data += b
+        return len(b)
+
+def build(method, descriptor=False, zip64=False):
+    sink = Unseekable() if descriptor else io.BytesIO()
+    with zipfile.ZipFile(sink, "w", compression=method) as z:
+        z.writestr("ENC_ROOT/", b"")
+        for name, data in MEMBERS.items():
+            with z.open(name, "w", force_zip64=zip64) as fp:
+                fp.write(data)
+    return bytes(sink.data if descriptor else sink.getvalue())
+
+def tree(root):
+    out = {}
+    for dirpath, _, files in os.walk(root):
+        for f in files:
+            path = os.path.join(dirpath, f)
+            with open(path, "rb") as fp:
+                out[os.path.relpath(path, root)] = fp.read()
+    return out
+
+def expected(blob, tmp_path):
+    ref = tmp_path / "ref"
+    with zipfile.ZipFile(io.BytesIO(blob)) as z:
+        z.extractall(ref)
+    return tree(ref)
+
+def stream(blob, dest, step):
+    ex = cb.ZipStreamExtractor(str(dest))
+    for i in range(0, len(blob), step):
+        ex.feed(blob[i:i + step])
+    ex.close()
+    return ex
+
+@pytest.mark.parametrize("method,descriptor,zip64", [
+    (zipfile.ZIP_STORED, False, False),
+    (zipfile.ZIP_DEFLATED, False, False),
+    (zipfile.ZIP_DEFLATED, True, False),
+    (zipfile.ZIP_STORED, False, True),
+    (zipfile.ZIP_DEFLATED, False, True),
+    (zipfile.ZIP_DEFLATED, True, True),
+], ids=["stored", "deflated", "deflated-descriptor", "stored-zip64",
+        "deflated-zip64", "deflated-descriptor-zip64"])
+@pytest.mark.parametrize("step", [7, 1 << 16, 1 << 24])
+def test_matches_extractall(tmp_path, method, descriptor, zip64, step):
+    blob = build(method, descriptor, zip64)
+    ex = stream(blob, tmp_path / "out", step)
+    got = tree(tmp_path / "out")
+    assert got == expected(blob, tmp_path)
+    assert len(ex.names) == len(MEMBERS)
+    assert not any(p.endswith(".part") for p in got)
+
+def test_stored_descriptor_is_refused(tmp_path):
+    blob = build(zipfile.ZIP_STORED, descriptor=True)
+    with pytest.raises(cb.StreamUnsupported):
+        stream(blob, tmp_path / "out", 1 << 16)
+
+def test_truncated_archive_is_refused(tmp_path):
+    blob = build(zipfile.ZIP_DEFLATED)
+    ex = cb.ZipStreamExtractor(str(tmp_path / "out"))
+    ex.feed(blob[:len(blob) // 2])
+    with pytest.raises(zipfile.BadZipFile):
+        ex.close()
+
+class Response:
+    def __init__(self, blob, start, cut):
+        self.status_code = 206 if start else 200
+        self.headers = {"ETag": '"v1"', "content-length": str(len(blob) - start)}
+        self.body, self.cut = blob[start:], cut
+    def __enter__(self):
+        return self
+    def __exit__(self, *exc):
+        return False
+    def raise_for_status(self):
+        pass
+    def iter_content(self, size):
+        end = len(self.body) if self.cut is None else self.cut
+        for i in range(0, end, 1000):
+            yield self.body[i:min(i + 1000, end)]
+        if self.cut is not None:
+            raise requests.exceptions.ChunkedEncodingError("connection reset")
+
+class Session:
+    """Serves blob, dropping the connection at each offset in cuts in turn."""
+    def __init__(self, blob, cuts):
+        self.blob, self.cuts, self.ranges = blob, list(cuts), []
+    def get(self, url, stream, timeout, headers):
+        start = int(headers["Range"][6:-1]) if "Range" in headers else 0
+        self.ranges.append((start, headers.get("If-Range")))
+        return Response(self.blob, start, self.cuts.pop(0) if self.cuts else None)
+
+class Bar:
+    def reset(self, total):
+        pass
+    def update(self, n):
+        pass
+
+@pytest.mark.parametrize("method,descriptor", [
+    (zipfile.ZIP_STORED, False), (zipfile.ZIP_DEFLATED, True)], ids=["stored", "deflated-descriptor"])
+def test_resumes_after_cut(tmp_path, monkeypatch, method, descriptor):
+    monkeypatch.setattr(cb.time, "sleep", lambda s: None)
+    blob = build(method, descriptor)
+    sess = Session(blob, [30_123, 150_000])
+    info = cb.fetch_zip_streaming("http://charts.test/a.zip", str(tmp_path / "out"), sess, Bar())
+    assert sess.ranges == [(0, None), (30_123, '"v1"'), (180_123, '"v1"')]
+    assert info["bytes"] == len(blob)
+    assert tree(tmp_path / "out") == expected(blob, tmp_path)